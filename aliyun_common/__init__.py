@@ -0,0 +1,10 @@
+from .credentials import (
+    StaticCredential,
+    RoleCredential,
+    OssCredentialsProvider,
+    credential_from_config,
+    credential_from_env,
+)
+from .clients import ClientFactory, client_factory, configure_http_pool
+from .throttle import CallLayer, TokenBucket, ThrottledClient, call_layer, classify_error, no_retry
+from .orchestrator import Orchestrator
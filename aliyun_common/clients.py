@@ -0,0 +1,100 @@
+import logging
+import importlib
+import threading
+
+from .credentials import OssCredentialsProvider
+from .throttle import ThrottledClient, call_layer
+
+# 产品名 -> SDK 客户端类，按需导入，各工具只需要安装自己用到的 SDK
+PRODUCTS = {
+    'sas': 'alibabacloud_sas20181203.client:Client',
+    'alidns': 'alibabacloud_alidns20150109.client:Client',
+    'waf': 'alibabacloud_waf_openapi20211001.client:Client',
+}
+
+
+def configure_http_pool(hosts=20, size=20):
+    """
+    调整 OpenAPI SDK（Tea）进程内共用的 HTTPS 连接池：hosts 为保留连接池的 endpoint 数，size 为每个 endpoint 的最大连接数。
+    默认值较小，多账号、多地域并发调用时连接会被频繁关闭重建。
+    """
+    from requests import adapters
+    from Tea.core import TeaCore
+    TeaCore.https_adapter = adapters.HTTPAdapter(pool_connections=hosts, pool_maxsize=size)
+
+
+class ClientFactory:
+    """
+    各工具共用的阿里云客户端工厂。
+
+    - 账号（凭证）注册一次，之后按 (账号, 产品, endpoint) 缓存 SDK 客户端，同一账号的第二次调用直接复用
+    - 返回的客户端经过 call_layer 代理：按产品和账号限速，限流/临时错误自动重试，见 throttle.py
+    - OSS 按账号缓存认证对象，按 endpoint 共用 oss2.Session（连接池），按 (账号, endpoint, 桶名) 缓存 Bucket
+    - 支持 AccessKey、STS Token 和 RAM 角色（到期前自动刷新）三种凭证，见 credentials.py
+    - 线程安全
+    """
+
+    def __init__(self):
+        self.accounts = {}
+        self.clients = {}
+        self.oss_auths = {}
+        self.oss_sessions = {}
+        self.buckets = {}
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def add_account(self, name, credential):
+        """注册账号凭证；同名账号已注册时保留原有凭证（及已缓存的客户端）"""
+        with self.lock:
+            self.accounts.setdefault(name, credential)
+            return self.accounts[name]
+
+    def credential(self, name):
+        return self.accounts[name]
+
+    def client(self, account, product, endpoint):
+        """返回 account 账号下 product 产品在 endpoint 上的客户端"""
+        key = (account, product, endpoint)
+        with self.lock:
+            client = self.clients.get(key)
+            if client is not None:
+                self.hits += 1
+                return client
+            self.misses += 1
+            from alibabacloud_tea_openapi import models as open_api_models
+            module_name, _, class_name = PRODUCTS[product].partition(':')
+            client_class = getattr(importlib.import_module(module_name), class_name)
+            config = open_api_models.Config(credential=self.accounts[account])
+            config.endpoint = endpoint
+            client = self.clients[key] = ThrottledClient(client_class(config), call_layer, product, account)
+            return client
+
+    def oss_bucket(self, account, endpoint, bucket_name):
+        """返回 OSS Bucket 对象，同一 endpoint 的桶共用连接池"""
+        import oss2
+        key = (account, endpoint, bucket_name)
+        with self.lock:
+            bucket = self.buckets.get(key)
+            if bucket is not None:
+                self.hits += 1
+                return bucket
+            self.misses += 1
+            auth = self.oss_auths.get(account)
+            if auth is None:
+                auth = self.oss_auths[account] = oss2.ProviderAuth(OssCredentialsProvider(self.accounts[account]))
+            session = self.oss_sessions.get(endpoint)
+            if session is None:
+                session = self.oss_sessions[endpoint] = oss2.Session()
+            bucket = self.buckets[key] = oss2.Bucket(auth, endpoint, bucket_name, session=session)
+            return bucket
+
+    def log_stats(self):
+        logging.info(
+            f"客户端缓存: {len(self.accounts)} 个账号, 创建 {self.misses} 个客户端, 复用 {self.hits} 次"
+        )
+        call_layer.log_stats()
+
+
+# 进程内默认的客户端工厂
+client_factory = ClientFactory()
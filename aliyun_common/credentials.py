@@ -0,0 +1,152 @@
+import os
+import time
+import logging
+import threading
+import contextvars
+
+# 当前线程/协程正在签名的请求所用的凭证快照 (凭证对象, 快照)，见 StaticCredential.get_access_key_id
+_pinned_snapshot = contextvars.ContextVar('pinned_credential_snapshot', default=None)
+
+
+class CredentialModel:
+    """同一次获取的一组凭证，字段与 alibabacloud_credentials.models.CredentialModel 一致"""
+
+    def __init__(self, access_key_id, access_key_secret, security_token, type):
+        self.access_key_id = access_key_id
+        self.access_key_secret = access_key_secret
+        self.security_token = security_token
+        self.bearer_token = None
+        self.type = type
+
+
+class StaticCredential:
+    """
+    固定的 AccessKey（可带 STS Token），接口与 alibabacloud_credentials 的 Client 一致，可直接传给 SDK 的 Config。
+
+    新版 Tea SDK 每个请求调用一次 get_credential()，三个字段来自同一个快照；
+    旧版 SDK 依次调用 get_access_key_id / get_access_key_secret / get_security_token，
+    取 AccessKeyId 时固定一份快照，同一线程（协程）随后取 Secret 和 Token 都使用这份快照，
+    中途凭证刷新也不会拼出不匹配的一组凭证。
+    """
+
+    def __init__(self, access_key_id, access_key_secret, security_token=None):
+        self.access_key_id = access_key_id
+        self.access_key_secret = access_key_secret
+        self.security_token = security_token
+
+    def snapshot(self):
+        """返回 (access_key_id, access_key_secret, security_token)"""
+        return self.access_key_id, self.access_key_secret, self.security_token
+
+    def get_credential(self):
+        access_key_id, access_key_secret, security_token = self.snapshot()
+        return CredentialModel(access_key_id, access_key_secret, security_token, self.get_type())
+
+    async def get_credential_async(self):
+        return self.get_credential()
+
+    def _pinned(self):
+        """get_access_key_id 固定的快照，没有时（或属于其他凭证对象）取一份新的"""
+        pinned = _pinned_snapshot.get()
+        if pinned is not None and pinned[0] is self:
+            return pinned[1]
+        return self.snapshot()
+
+    def get_access_key_id(self):
+        snapshot = self.snapshot()
+        _pinned_snapshot.set((self, snapshot))
+        return snapshot[0]
+
+    def get_access_key_secret(self):
+        return self._pinned()[1]
+
+    def get_security_token(self):
+        return self._pinned()[2]
+
+    async def get_access_key_id_async(self):
+        return self.get_access_key_id()
+
+    async def get_access_key_secret_async(self):
+        return self.get_access_key_secret()
+
+    async def get_security_token_async(self):
+        return self.get_security_token()
+
+    def get_type(self):
+        return 'sts' if self.security_token else 'access_key'
+
+
+class RoleCredential(StaticCredential):
+    """
+    通过 STS AssumeRole 扮演 RAM 角色获得的临时凭证。
+    距过期不足 refresh_before 秒时重新获取，多线程共用时只刷新一次，三个字段始终来自同一次获取。
+    """
+
+    def __init__(self, access_key_id, access_key_secret, role_arn, role_session_name='python-tools',
+                 duration=3600, refresh_before=300, region_id='cn-hangzhou'):
+        from alibabacloud_credentials.providers import RamRoleArnCredentialProvider
+        super().__init__(None, None)
+        self.provider = RamRoleArnCredentialProvider(
+            access_key_id=access_key_id,
+            access_key_secret=access_key_secret,
+            role_session_name=role_session_name,
+            role_arn=role_arn,
+            region_id=region_id,
+        )
+        self.provider.duration_seconds = duration
+        self.role_arn = role_arn
+        self.refresh_before = refresh_before
+        self.expiration = 0
+        self.lock = threading.Lock()
+
+    def snapshot(self):
+        with self.lock:
+            if time.time() >= self.expiration - self.refresh_before:
+                credential = self.provider.get_credentials()
+                self.access_key_id = credential.access_key_id
+                self.access_key_secret = credential.access_key_secret
+                self.security_token = credential.security_token
+                self.expiration = credential.expiration
+                logging.info(f"已获取角色 {self.role_arn} 的临时凭证，有效期至 {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.expiration))}")
+            return self.access_key_id, self.access_key_secret, self.security_token
+
+    def get_type(self):
+        return 'sts'
+
+
+class OssCredentialsProvider:
+    """把上面的凭证适配为 oss2.ProviderAuth 使用的 credentials provider，每次签名都取最新的凭证"""
+
+    def __init__(self, credential):
+        self.credential = credential
+
+    def get_credentials(self):
+        from oss2.credentials import Credentials
+        return Credentials(*self.credential.snapshot())
+
+
+def credential_from_config(account):
+    """
+    按账号配置创建凭证，配置格式与 config.json 一致:
+    {"name": "uat", "ak": "...", "sk": "..."}，可选 "role_arn"、"role_session_name"、"duration" 以扮演角色
+    """
+    if account.get('role_arn'):
+        return RoleCredential(
+            account['ak'], account['sk'], account['role_arn'],
+            role_session_name=account.get('role_session_name', 'python-tools'),
+            duration=int(account.get('duration', 3600)),
+        )
+    return StaticCredential(account['ak'], account['sk'], account.get('security_token'))
+
+
+def credential_from_env(prefix='ALIBABA_CLOUD'):
+    """
+    从环境变量创建凭证: {prefix}_ACCESS_KEY_ID、{prefix}_ACCESS_KEY_SECRET，
+    可选 {prefix}_SECURITY_TOKEN（或 {prefix}_SESSION_TOKEN），或 {prefix}_ROLE_ARN（扮演角色）
+    """
+    return credential_from_config({
+        'ak': os.environ[f'{prefix}_ACCESS_KEY_ID'],
+        'sk': os.environ[f'{prefix}_ACCESS_KEY_SECRET'],
+        'security_token': os.environ.get(f'{prefix}_SECURITY_TOKEN') or os.environ.get(f'{prefix}_SESSION_TOKEN'),
+        'role_arn': os.environ.get(f'{prefix}_ROLE_ARN'),
+    })
@@ -0,0 +1,95 @@
+import time
+import signal
+import asyncio
+import logging
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+
+class Orchestrator:
+    """
+    在一个 asyncio 事件循环中运行多个导出/巡检任务。
+
+    - 任务是 async 函数，以 (orchestrator, *args) 调用，任务内部可以再用 asyncio.gather 拆成任意多个子任务
+    - SDK 调用、下载、写文件等阻塞操作通过 blocking() 交给大小为 max_blocking 的线程池执行，
+      等待导出完成之类的轮询用 asyncio.sleep，不占线程，成百上千个账号/资源也只需要固定数量的线程
+    - 每个任务可以设置单独的超时（秒），另有整体超时 deadline；超时、Ctrl+C 或 SIGTERM 时取消未完成的任务
+    - 已经在线程中执行的阻塞调用无法中断，会执行到结束（SDK 自身有连接/读取超时），排队中的调用直接丢弃
+    - 单个任务失败不影响其他任务，结束后输出每个任务的状态和耗时
+    """
+
+    def __init__(self, max_blocking=32, deadline=None):
+        self.max_blocking = max_blocking
+        self.deadline = deadline
+        self.executor = None
+        self.jobs = []
+        self.results = {}
+        self.metrics = []
+        self.blocking_calls = 0
+
+    def add(self, name, job, *args, deadline=None):
+        """登记任务，deadline 为该任务的超时（秒）"""
+        self.jobs.append((name, job, args, deadline))
+
+    async def blocking(self, fn, *args, **kwargs):
+        """在线程池中执行阻塞调用并等待结果"""
+        self.blocking_calls += 1
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(fn, *args, **kwargs))
+
+    def run(self):
+        """运行全部任务直到结束，返回 {任务名: 结果}，失败的任务结果为异常对象"""
+        self.executor = ThreadPoolExecutor(max_workers=self.max_blocking, thread_name_prefix='blocking')
+        try:
+            asyncio.run(self._main())
+        finally:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.log_metrics()
+        return self.results
+
+    async def _main(self):
+        loop = asyncio.get_running_loop()
+        tasks = [asyncio.create_task(self._run_job(*job), name=job[0]) for job in self.jobs]
+
+        def cancel_all(signame):
+            logging.warning(f"收到 {signame}，取消未完成的任务")
+            for task in tasks:
+                task.cancel()
+
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, cancel_all, sig.name)
+            except (NotImplementedError, RuntimeError):
+                # Windows 或非主线程中不支持
+                pass
+
+        _, pending = await asyncio.wait(tasks, timeout=self.deadline)
+        if pending:
+            logging.warning(f"整体超时 {self.deadline}s，取消 {len(pending)} 个未完成的任务")
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    async def _run_job(self, name, job, args, deadline):
+        started = time.monotonic()
+        status = 'success'
+        try:
+            self.results[name] = await asyncio.wait_for(job(self, *args), deadline)
+        except asyncio.TimeoutError as error:
+            status = 'timeout'
+            self.results[name] = error
+            logging.error(f"[{name}] 任务超时（{deadline}s），已取消")
+        except asyncio.CancelledError as error:
+            status = 'cancelled'
+            self.results[name] = error
+        except Exception as error:
+            status = 'failed'
+            self.results[name] = error
+            logging.exception(f"[{name}] 任务失败: {error}")
+        finally:
+            self.metrics.append({'name': name, 'status': status, 'elapsed': time.monotonic() - started})
+
+    def log_metrics(self):
+        for m in self.metrics:
+            logging.info(f"[{m['name']}] 任务结束: {m['status']}，耗时 {m['elapsed']:.1f}s")
+        logging.info(f"共 {len(self.metrics)} 个任务，阻塞调用 {self.blocking_calls} 次，线程池大小 {self.max_blocking}")
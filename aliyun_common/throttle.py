@@ -0,0 +1,208 @@
+import os
+import time
+import random
+import logging
+import threading
+import contextlib
+import contextvars
+from collections import defaultdict
+
+# 各产品每个账号的默认调用频率上限（次/秒），低于官方公布的 API 限流值并留有余量，
+# 可通过环境变量 ALIYUN_QPS_<产品名大写> 覆盖，如 ALIYUN_QPS_ALIDNS=20
+DEFAULT_QPS = {
+    'sas': 5,
+    'alidns': 10,
+    'waf': 10,
+}
+
+# 限流错误码（前缀匹配）
+THROTTLING_CODES = ('Throttling', 'QpsLimitExceeded', 'Flow.Control', 'TooManyRequests')
+# 可重试的服务端临时错误码
+TRANSIENT_CODES = ('InternalError', 'ServiceUnavailable', 'ServiceBusy', 'RequestTimeout', 'SystemBusy')
+
+# 非幂等的 API（按 ThrottledClient 中的名称，即去掉 _with_options 的方法名）：超时或连接错误时请求可能已经执行，
+# 重试会重复创建（如重复提交导出任务），这类 API 只在明确被限流（请求未执行）时重试
+NON_IDEMPOTENT_APIS = {'export_vul'}
+
+THROTTLED = 'throttled'
+TRANSIENT = 'transient'
+PERMANENT = 'permanent'
+
+# 当前线程/协程中的调用是否不重试，见 no_retry()
+_no_retry = contextvars.ContextVar('no_retry', default=False)
+
+
+@contextlib.contextmanager
+def no_retry():
+    """
+    在此范围内经过 CallLayer 的调用失败时不退避重试，直接抛出（仍计入统计，限流时仍暂停令牌桶）。
+    用于自己安排重试时间的调用方，如导出任务轮询：失败后按轮询间隔重新排期，不在轮询线程中 sleep。
+    """
+    token = _no_retry.set(True)
+    try:
+        yield
+    finally:
+        _no_retry.reset(token)
+
+
+def classify_error(error):
+    """把 SDK 抛出的异常分为 限流 / 临时错误（可重试）/ 永久错误（不重试）"""
+    # 网络错误在 SDK 中被包装为 UnretryableException，真正的异常在 inner_exception 中
+    inner = getattr(error, 'inner_exception', None)
+    if inner is not None and inner is not error:
+        return classify_error(inner)
+    if type(error).__name__ == 'RetryError' or isinstance(error, OSError):
+        return TRANSIENT
+    code = str(getattr(error, 'code', '') or '')
+    if code.startswith(THROTTLING_CODES):
+        return THROTTLED
+    data = getattr(error, 'data', None)
+    status = data.get('statusCode') if isinstance(data, dict) else None
+    if status == 429:
+        return THROTTLED
+    if code.startswith(TRANSIENT_CODES) or (isinstance(status, int) and status >= 500):
+        return TRANSIENT
+    return PERMANENT
+
+
+class TokenBucket:
+    """令牌桶，按 rate 次/秒发放令牌，最多累积 burst 个，线程安全"""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst or max(1, int(rate))
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """取一个令牌，没有时等待；返回等待的秒数"""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def penalize(self, seconds):
+        """收到限流错误后，在 seconds 秒内不再发放令牌"""
+        with self.lock:
+            self.tokens = min(self.tokens, -seconds * self.rate)
+
+
+class CallLayer:
+    """
+    所有 OpenAPI 调用的统一入口：
+
+    - 按 (产品, 账号) 使用独立的令牌桶限速
+    - 限流和临时错误按指数退避 + 随机抖动重试，最多 max_retries 次；限流时同时暂停该令牌桶
+    - 非幂等的 API（non_idempotent）只在限流时重试，超时、连接错误等临时错误直接抛出，由调用方决定如何处理
+    - no_retry() 范围内的调用不重试，失败直接抛出
+    - 参数错误、权限不足等永久错误直接抛出，不重试
+    - 按 (产品, API) 统计调用、重试、限流、失败次数
+    """
+
+    def __init__(self, max_retries=4, base_delay=0.5, max_delay=20, non_idempotent=NON_IDEMPOTENT_APIS):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.non_idempotent = set(non_idempotent)
+        self.limits = {}
+        self.buckets = {}
+        self.stats = defaultdict(lambda: {'calls': 0, 'retries': 0, 'throttles': 0, 'failures': 0, 'wait': 0.0})
+        self.lock = threading.Lock()
+
+    def set_limit(self, product, qps):
+        """设置产品的 QPS 上限（对之后新建的令牌桶生效）"""
+        self.limits[product] = qps
+
+    def mark_non_idempotent(self, api):
+        """登记非幂等的 API，之后只在限流时重试"""
+        self.non_idempotent.add(api)
+
+    def limit(self, product):
+        if product in self.limits:
+            return self.limits[product]
+        return float(os.environ.get(f'ALIYUN_QPS_{product.upper()}', DEFAULT_QPS.get(product, 10)))
+
+    def bucket(self, product, account):
+        key = (product, account)
+        with self.lock:
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                bucket = self.buckets[key] = TokenBucket(self.limit(product))
+            return bucket
+
+    def call(self, product, account, api, fn, *args, **kwargs):
+        bucket = self.bucket(product, account)
+        key = (product, api)
+        for attempt in range(self.max_retries + 1):
+            self._count(key, 'wait', bucket.acquire())
+            self._count(key, 'calls')
+            try:
+                return fn(*args, **kwargs)
+            except Exception as error:
+                kind = classify_error(error)
+                if kind == TRANSIENT and api in self.non_idempotent:
+                    self._count(key, 'failures')
+                    logging.warning(f"[{product}/{account}] {api} 调用失败（{kind}），非幂等调用不重试")
+                    raise
+                if kind == PERMANENT or attempt == self.max_retries:
+                    self._count(key, 'failures')
+                    raise
+                delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+                if kind == THROTTLED:
+                    self._count(key, 'throttles')
+                    # 限流时整个账号的该产品都暂停一段时间，避免其他线程继续撞上限流
+                    delay = max(delay, 1.0)
+                    bucket.penalize(delay)
+                if _no_retry.get():
+                    self._count(key, 'failures')
+                    raise
+                self._count(key, 'retries')
+                logging.warning(
+                    f"[{product}/{account}] {api} 第 {attempt + 1} 次调用失败（{kind}），{delay:.1f}s 后重试: "
+                    f"{getattr(error, 'message', error)}"
+                )
+                time.sleep(delay)
+
+    def _count(self, key, name, value=1):
+        with self.lock:
+            self.stats[key][name] += value
+
+    def log_stats(self):
+        for (product, api), stats in sorted(self.stats.items()):
+            logging.info(
+                f"[{product}] {api}: 调用 {stats['calls']} 次, 重试 {stats['retries']} 次, "
+                f"限流 {stats['throttles']} 次, 失败 {stats['failures']} 次, 限速等待 {stats['wait']:.1f}s"
+            )
+
+
+class ThrottledClient:
+    """
+    SDK 客户端的代理：*_with_options 的 API 方法经过 CallLayer（限速 + 重试 + 统计），其他属性直接转发。
+    各工具统一使用 *_with_options 形式调用 API。
+    """
+
+    def __init__(self, client, layer, product, account):
+        self._client = client
+        self._layer = layer
+        self._product = product
+        self._account = account
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        if not callable(attr) or not name.endswith('_with_options'):
+            return attr
+        api = name[:-len('_with_options')]
+
+        def call(*args, **kwargs):
+            return self._layer.call(self._product, self._account, api, attr, *args, **kwargs)
+        return call
+
+
+# 进程内共用的调用层
+call_layer = CallLayer()
@@ -2,17 +2,37 @@
 # This file is auto-generated, don't edit it. Thanks.
 import os
 import sys
-import yaml
 import json
+import logging
 
 from typing import List
 
 from alibabacloud_alidns20150109.client import Client as Alidns20150109Client
-from alibabacloud_tea_openapi import models as open_api_models
-from alibabacloud_alidns20150109 import models as alidns_20150109_models
 from alibabacloud_tea_util import models as util_models
 from alibabacloud_tea_util.client import Client as UtilClient
 
+# 仓库根目录下的共用模块 aliyun_common
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from aliyun_common import client_factory, credential_from_env, configure_http_pool, call_layer
+
+from dns_export import DnsRecordExporter
+from ssl_targets import SslTargetStore
+
+# API 调用统计等日志输出到控制台
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# 要导出的域名，逗号分隔；设置为 * 时导出账号下的全部域名
+dns_domains = os.environ.get('DNS_DOMAINS', 'kerryplus.com').split(',')
+# 并发请求数和整体调用频率上限（云解析 API 有 QPS 限制）
+export_workers = int(os.environ.get('DNS_EXPORT_WORKERS', '4'))
+api_qps = float(os.environ.get('DNS_API_QPS', '10'))
+# 解析记录输出文件，每行一条记录（JSON Lines）
+output_file = os.environ.get('DNS_OUTPUT_FILE', 'domain_records_enable.jsonl')
+
+# 凭证来自环境变量 ALIBABA_CLOUD_ACCESS_KEY_ID / ALIBABA_CLOUD_ACCESS_KEY_SECRET，
+# 另外设置 ALIBABA_CLOUD_ROLE_ARN 时通过 STS 扮演该角色，临时凭证到期前自动刷新
+client_factory.add_account('default', credential_from_env())
+
 
 class Sample:
     def __init__(self):
@@ -26,16 +46,9 @@ class Sample:
         @throws Exception
         """
         # 工程代码泄露可能会导致 AccessKey 泄露，并威胁账号下所有资源的安全性。以下代码示例仅供参考。
-        # 建议使用更安全的 STS 方式，更多鉴权访问方式请参见：https://help.aliyun.com/document_detail/378659.html。
-        config = open_api_models.Config(
-            # 必填，请确保代码运行环境设置了环境变量 ALIBABA_CLOUD_ACCESS_KEY_ID。,
-            access_key_id=os.environ['ALIBABA_CLOUD_ACCESS_KEY_ID'],
-            # 必填，请确保代码运行环境设置了环境变量 ALIBABA_CLOUD_ACCESS_KEY_SECRET。,
-            access_key_secret=os.environ['ALIBABA_CLOUD_ACCESS_KEY_SECRET']
-        )
+        # 客户端由共用的客户端工厂创建并缓存，凭证见文件开头的 add_account
         # Endpoint 请参考 https://api.aliyun.com/product/Alidns
-        config.endpoint = f'alidns.cn-shanghai.aliyuncs.com'
-        return Alidns20150109Client(config)
+        return client_factory.client('default', 'alidns', 'alidns.cn-shanghai.aliyuncs.com')
     
     @staticmethod
     def generate_ssl_monitoring_item(record):
@@ -53,109 +66,69 @@ class Sample:
             }
         }
 
+    @staticmethod
+    def write_records(records, path=None) -> dict:
+        """
+        每条记录一行 JSON 写入文件，同时根据 A/CNAME 记录生成期望的 SSL 监控项，
+        返回按 target 去重的 {target URL: 监控项}
+        """
+        desired = {}
+        with open(path or output_file, 'w', encoding='utf-8') as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+                if record['Type'] in ('A', 'CNAME'):
+                    item = Sample.generate_ssl_monitoring_item(record)
+                    desired.setdefault(item['targets'][0], item)
+        return desired
+
+    @staticmethod
+    def sync_ssl_targets(desired, synced_domains, path='ssl-cert-job.yaml') -> None:
+        """与现有的 SSL 监控配置比较，新增、更新、删除监控项；只有发生变化时才重写配置文件"""
+        target_store = SslTargetStore(path)
+        summary = target_store.sync(desired, synced_domains)
+        logging.info(f"新增 {summary['added']} 个, 更新 {summary['updated']} 个, 删除 {summary['removed']} 个监控目标")
+        if not target_store.save():
+            logging.info("SSL monitoring configuration is up to date.")
+            return
+        logging.info("SSL monitoring configuration has been updated successfully!")
+
     @staticmethod
     def main(
         args: List[str],
     ) -> None:
-        # 调用客户端
+        # 调用客户端，连接池不小于并发数，云解析 API 的调用频率不超过 api_qps
+        configure_http_pool(size=max(export_workers, 10))
+        call_layer.set_limit('alidns', api_qps)
         client = Sample.create_client()
-        # 第一个参数：请求对象
-        describe_domain_records_request = alidns_20150109_models.DescribeDomainRecordsRequest(
-            domain_name='kerryplus.com',
-            page_size=500,
-            status='ENABLE'
-        )
-        # 第二个参数：运行时参数选项
+        # 运行时参数选项
         runtime = util_models.RuntimeOptions()
+        exporter = DnsRecordExporter(client, runtime, workers=export_workers, status='ENABLE')
         try:
-            # 复制代码运行请自行打印 API 的返回值
-            response = client.describe_domain_records_with_options(describe_domain_records_request, runtime)
-            # print(response.body)
-            # 方法1：直接打印格式化的 JSON 字符串
-            # print(json.dumps(response.body.to_map(), indent=2, ensure_ascii=False))
-            '''
-            阿里云 SDK 的设计者考虑到了这一点，所以在他们的对象中提供了 to_map() 方法，
-            这个方法会返回一个包含所有必要数据的 Python 字典，这个字典就可以被 json.dump() 正确处理。
-            '''
-            # 先转换为 Python 字典，再序列化为 JSON 写入文件
-            # 使用 with 语句来处理文件操作
-            # 方法2
-            with open('domain_records_enable.json', 'w', encoding='utf-8') as f:
-                json.dump(
-                    response.body.to_map(), 
-                    f,
-                    ensure_ascii=False,
-                    indent=2
-                )
-            # 读取并打印文件内容
-            # with open('domain_records_enable.json', 'r', encoding='utf-8') as f:
-            #     print(f.read())
-            # 方法3：如果只想看字典格式的数据
-            # print(response.body.to_map())
-
-            # 打印解析记录
-            records_data = []  # 用于存储解析记录数据
-            # print(response.body.domain_records.record)
-            # 遍历所有记录
-            for record in response.body.domain_records.record:
-                records_data.append(record.to_map())
-            
+            # 要导出的域名列表，* 表示通过 DescribeDomains 导出账号下的全部域名
+            if dns_domains == ['*']:
+                domains = exporter.discover_domains()
+                logging.info(f"发现 {len(domains)} 个域名")
+            else:
+                domains = dns_domains
 
-            # 1. 读取现有的 SSL 监控配置
-            existing_config = {}
-            try:
-                with open('ssl-cert-job.yaml', 'r', encoding='utf-8') as f:
-                    existing_config = yaml.safe_load(f)
-            except FileNotFoundError:
-                existing_config = {'serverFiles': {'ssl_cert_job.yml': []}}
-            
-            # 确保配置结构完整
-            if 'serverFiles' not in existing_config:
-                existing_config['serverFiles'] = {}
-            if 'ssl_cert_job.yml' not in existing_config['serverFiles']:
-                existing_config['serverFiles']['ssl_cert_job.yml'] = []
-
-            # 2. 获取现有的监控目标列表（用于去重）
-            existing_targets = set()
-            for item in existing_config['serverFiles']['ssl_cert_job.yml']:
-                # 添加空值检查
-                if item and 'targets' in item and item['targets']:
-                    existing_targets.update(item['targets'])
-
-            # 3. 添加新的监控项（避免重复）
-            for record in records_data:
-                # 只处理 A 记录和 CNAME 记录
-                if record['Type'] not in ['A', 'CNAME']:
-                    continue
-
-                full_domain = f"{record['RR']}.{record['DomainName']}"
-                target_url = f"https://{full_domain}"
-
-                # 如果目标已存在，跳过
-                if target_url in existing_targets:
-                    print(f"跳过已存在的目标: {target_url}")
-                    continue
-
-                # 生成新的监控项并添加
-                new_item = Sample.generate_ssl_monitoring_item(record)
-                existing_config['serverFiles']['ssl_cert_job.yml'].append(new_item)
-                existing_targets.add(target_url)
-
-            # 4. 保存更新后的配置
-            with open('ssl-cert-job.yaml', 'w', encoding='utf-8') as f:
-                yaml.dump(existing_config, f, allow_unicode=True, sort_keys=False, default_flow_style=False)
-
-            print("SSL monitoring configuration has been updated successfully!")
+            # 分页并发获取全部解析记录，边取边写入文件，同时生成期望的 SSL 监控项
+            desired = Sample.write_records(exporter.iter_records(domains))
+
+            # 输出客户端复用和 API 调用/重试/限流统计
+            client_factory.log_stats()
+
+            # 导出失败的域名不删除监控项
+            Sample.sync_ssl_targets(desired, set(domains) - set(exporter.failed))
 
         except Exception as error:
             # 改进错误处理
             if hasattr(error, 'message'):
-                print(f"Error message: {error.message}")
+                logging.error(f"Error message: {error.message}")
             else:
-                print(f"Error: {str(error)}")
+                logging.error(f"Error: {str(error)}")
             
             if hasattr(error, 'data') and hasattr(error.data, 'get'):
-                print(f"Recommendation: {error.data.get('Recommend')}")
+                logging.error(f"Recommendation: {error.data.get('Recommend')}")
 
                 
             # # 打印某一条数据
@@ -170,9 +143,9 @@ class Sample:
         except Exception as error:
             # 此处仅做打印展示，请谨慎对待异常处理，在工程项目中切勿直接忽略异常。
             # 错误 message
-            print(error.message)
+            logging.error(error.message)
             # 诊断地址
-            print(error.data.get("Recommend"))
+            logging.error(error.data.get("Recommend"))
             UtilClient.assert_as_string(error.message)
 
 
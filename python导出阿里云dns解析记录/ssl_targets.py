@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+import os
+import yaml
+import logging
+
+# 有 libyaml 时使用 C 实现的解析/输出，速度快很多
+Loader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+Dumper = getattr(yaml, 'CSafeDumper', yaml.SafeDumper)
+
+# 由本脚本生成的监控项带有这个 project 标签，只有这些监控项会被更新或删除，手工添加的监控项保持不变
+MANAGED_PROJECT = 'DNS Records'
+
+
+class SslTargetStore:
+    """
+    SSL 监控配置（ssl-cert-job.yaml）中监控项的索引，按 target URL 查找。
+
+    sync() 根据当前的解析记录计算需要新增、删除、更新的监控项并应用到配置上，
+    save() 只在有变化时才重写文件。
+    """
+
+    def __init__(self, path, files_key='ssl_cert_job.yml'):
+        self.path = path
+        self.files_key = files_key
+        self.config = self._load()
+        self.items = self.config['serverFiles'][files_key]
+        self.index = {}
+        for item in self.items:
+            # 跳过空项和没有 targets 的项
+            if item and item.get('targets'):
+                for target in item['targets']:
+                    self.index.setdefault(target, item)
+        self.changed = False
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                config = yaml.load(f, Loader=Loader) or {}
+        except FileNotFoundError:
+            config = {}
+        # 确保配置结构完整
+        config.setdefault('serverFiles', {})
+        if not config['serverFiles'].get(self.files_key):
+            config['serverFiles'][self.files_key] = []
+        return config
+
+    @staticmethod
+    def is_managed(item):
+        return bool(item) and (item.get('labels') or {}).get('project') == MANAGED_PROJECT
+
+    def sync(self, desired, synced_domains):
+        """
+        desired 为 {target URL: 监控项}，由当前的解析记录生成。
+        只有 synced_domains 中的域名（本次成功导出的域名）下的托管监控项会被删除，
+        导出失败的域名保持原样，避免误删。返回 {'added': n, 'updated': n, 'removed': n}。
+        """
+        summary = {'added': 0, 'updated': 0, 'removed': 0}
+
+        removed = set()
+        for target, item in self.index.items():
+            if target in desired or not self.is_managed(item):
+                continue
+            if item['labels'].get('domain') in synced_domains:
+                removed.add(id(item))
+                logging.info(f"删除已不存在的目标: {target}")
+        if removed:
+            self.items[:] = [item for item in self.items if id(item) not in removed]
+            self.index = {target: item for target, item in self.index.items() if id(item) not in removed}
+            summary['removed'] = len(removed)
+
+        for target, new_item in desired.items():
+            item = self.index.get(target)
+            if item is None:
+                self.items.append(new_item)
+                self.index[target] = new_item
+                summary['added'] += 1
+                logging.info(f"新增目标: {target}")
+            elif self.is_managed(item) and item != new_item:
+                item.clear()
+                item.update(new_item)
+                summary['updated'] += 1
+                logging.info(f"更新目标: {target}")
+
+        self.changed = self.changed or any(summary.values())
+        return summary
+
+    def save(self):
+        """有变化时写回配置文件（先写临时文件再替换），返回是否写入"""
+        if not self.changed:
+            return False
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            yaml.dump(self.config, f, Dumper=Dumper, allow_unicode=True, sort_keys=False, default_flow_style=False)
+        os.replace(tmp_path, self.path)
+        self.changed = False
+        return True
@@ -1,27 +1,51 @@
 import os
+import sys
 import json
-import time
-import smtplib
-import zipfile
+import asyncio
 import logging
-import requests
 import pandas as pd
-from io import BytesIO
-from typing import List
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from email.mime.application import MIMEApplication
-
-from alibabacloud_sas20181203.client import Client as Sas20181203Client
-from alibabacloud_tea_openapi import models as open_api_models
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
 from alibabacloud_sas20181203 import models as sas_20181203_models
 from alibabacloud_tea_util import models as util_models
 
+# 仓库根目录下的共用模块 aliyun_common（镜像中与脚本放在同一目录）
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from aliyun_common import client_factory, credential_from_config
+
+from export_poller import ExportPoller, FAILED_STATUSES
+from download_client import DownloadClient
+from vul_dataset import merge_excels, merge_excels_chunked, save_dataset, load_dataset, iter_dataset
+from routing_rules import RoutingTable
+from xlsx_writer import XlsxAppender, write_xlsx_files, XLSX_WORKERS
+from bulk_mailer import BulkMailer
+from vul_delta import BucketDigest, DeltaStore
+from run_journal import RunJournal
+
 # ---------------------------- 基础配置 ----------------------------
 smtp_server = "smtpdm.aliyun.com"  # 固定地址，勿改
 smtp_port = 80                   # 非加密端口
 from_email = "devops-monitor@smtp.******.com"      # 你的发信地址
 email_password = "****************"         # SMTP密码
+mail_per_minute = int(os.environ.get("VUL_MAIL_PER_MINUTE", "30"))  # 每分钟最多发送的邮件数
+
+# 并发配置：同时轮询/下载的导出任务数，设为 1 时按原串行方式逐个处理
+max_workers = int(os.environ.get("VUL_EXPORT_WORKERS", "8"))
+# 导出任务总超时（秒），从提交导出任务开始计算
+export_deadline = int(os.environ.get("VUL_EXPORT_DEADLINE", "3600"))
+# 拆分路由规则配置文件
+routing_rules_file = os.environ.get("VUL_ROUTING_RULES", "routing-rules.json")
+# 增量模式：只处理、发送与上次运行相比有变化的数据，指纹库需放在持久化目录
+delta_mode = os.environ.get("VUL_DELTA_MODE", "0") == "1"
+delta_state_dir = os.environ.get("VUL_DELTA_STATE_DIR", "delta-state")
+# 合并方式：memory 一次读入全部文件后合并；streaming 分块读取、边读边写入数据集，峰值内存不随账号数增长
+merge_mode = os.environ.get("VUL_MERGE_MODE", "memory")
+# 拆分文件并行写出的进程数（VUL_XLSX_WORKERS），设为 1 时在当前线程内逐个写出
+xlsx_workers = XLSX_WORKERS
+# 运行日志：中断后重新运行时从上次完成的阶段继续，需与下载的文件一起放在持久化目录
+journal_file = os.environ.get("VUL_JOURNAL_FILE", "")
+journal_max_age = int(os.environ.get("VUL_JOURNAL_MAX_AGE", "86400"))  # 超过该时间（秒）未完成的运行不再继续
+journal_link_ttl = int(os.environ.get("VUL_JOURNAL_LINK_TTL", "1800"))  # 下载链接按该时间（秒）视为有效
 
 
 
@@ -37,15 +61,28 @@ logging.basicConfig(
     ]
 )
 
+journal = RunJournal(
+    journal_file or os.path.join(output_dir, "run-journal.json"),
+    max_age=journal_max_age,
+    link_ttl=journal_link_ttl,
+)
+
+# 集中轮询调度器：所有导出任务共用，自适应退避 + 总超时
+poller = ExportPoller(deadline=export_deadline)
+
+# 共享下载客户端：连接池复用 + 连接/读取超时 + 5xx 与连接错误指数退避重试
+http_client = DownloadClient(
+    pool_size=max(max_workers, 10),
+    connect_timeout=int(os.environ.get("VUL_DOWNLOAD_CONNECT_TIMEOUT", "10")),
+    read_timeout=int(os.environ.get("VUL_DOWNLOAD_READ_TIMEOUT", "120")),
+)
+
 # ---------------------------- 核心功能 ----------------------------
 # 创建客户端
-def create_client(ak, sk):
-    config = open_api_models.Config(
-        access_key_id=ak,
-        access_key_secret=sk
-    )
-    config.endpoint = 'tds.aliyuncs.com'
-    return Sas20181203Client(config)
+def create_client(account):
+    # 同一账号只创建一次客户端，支持 AK/SK 和 RAM 角色（role_arn）两种配置
+    client_factory.add_account(account["name"], credential_from_config(account))
+    return client_factory.client(account["name"], "sas", "tds.aliyuncs.com")
 
 # 导出漏洞
 def export_vulnerability(client, vul_type):
@@ -58,221 +95,355 @@ def export_vulnerability(client, vul_type):
     result = client.export_vul_with_options(request, util_models.RuntimeOptions())
     return result.body.id
 
-# 等待导出完成，返回下载链接地址
-def wait_for_export(client, export_id, name):
-    for _ in range(60):
+# 提交导出任务；运行日志中有仍可查询的导出任务时直接复用，不再重新导出
+def submit_export(client, name, vul_type):
+    key = f"{name}_{vul_type}"
+    export_id = journal.export_id(key)
+    if export_id is not None:
         try:
             request = sas_20181203_models.DescribeVulExportInfoRequest(export_id=export_id)
             result = client.describe_vul_export_info_with_options(request, util_models.RuntimeOptions())
-            if result.body.export_status == "success":
-                logging.info(f"[{name}] 导出成功: {result.body.link}")
-                return result.body.link
+            if result.body.export_status not in FAILED_STATUSES:
+                logging.info(f"[{name}] 复用 {vul_type} 类型漏洞导出任务: {export_id}")
+                return export_id
         except Exception as e:
-            logging.warning(f"[{name}] 查询导出状态失败: {e}")
-        time.sleep(15)
-    raise TimeoutError(f"[{name}] 导出超时")
+            logging.warning(f"[{name}] 导出任务 {export_id} 已不可用，重新提交: {e}")
+    export_id = export_vulnerability(client, vul_type)
+    journal.record_submitted(key, export_id)
+    logging.info(f"[{name}] 已提交 {vul_type} 类型漏洞导出任务: {export_id}")
+    return export_id
+
+# 运行日志中已有的阶段：返回 (已下载的文件, 未过期的下载链接)，都没有时需要提交导出任务
+def resume_export(name, vul_type):
+    key = f"{name}_{vul_type}"
+    xlsx_path = journal.downloaded(key)
+    if xlsx_path:
+        logging.info(f"[{name}] 复用已下载的 {vul_type} 类型漏洞文件: {xlsx_path}")
+        return xlsx_path, None
+    return None, journal.link(key)
+
+# 等待导出完成，返回下载链接地址
+def wait_for_export(client, export_id, name):
+    return poller.wait(client, export_id, name)
 
 # 下载并解压文件
 def download_xlsx(url, name):
+    journal.record_linked(name, url)
     try:
-        response = requests.get(url)
-        if response.status_code == 200:
-            with zipfile.ZipFile(BytesIO(response.content), 'r') as zip_ref:
-                for file_info in zip_ref.infolist():
-                    if file_info.filename.endswith(".xlsx"):
-                        zip_ref.extract(file_info, output_dir)
-                        extracted_path = os.path.join(output_dir, file_info.filename)
-                        renamed_path = os.path.join(output_dir, f"{name}_{file_info.filename}")
-                        os.rename(extracted_path, renamed_path)
-                        return renamed_path
-        logging.error(f"[{name}] 下载失败，状态码: {response.status_code}")
+        # 分块流式下载到临时文件（支持断点续传），校验后直接解压到 {name}_{文件名}
+        xlsx_path = http_client.download_and_extract(url, name, output_dir)
+        if xlsx_path:
+            journal.record_downloaded(name, xlsx_path)
+            return xlsx_path
+        logging.error(f"[{name}] 压缩包中没有 .xlsx 文件")
     except Exception as e:
-        logging.error(f"[{name}] 解压失败: {e}")
+        logging.error(f"[{name}] 下载或解压失败: {e}")
+    # 链接可能已失效，下次运行重新查询导出任务
+    journal.discard_link(name)
     return None
 
-# # 合并多个Excel文件
-def merge_excels(file_paths: List[str], output_file: str):
-    dataframes = []
-    for path in file_paths:
-        try:
-            df = pd.read_excel(path)
-            basename = os.path.basename(path)
-            parts = basename.split("_")
-            df["来源账号"] = parts[0]
-            df["漏洞类型"] = parts[1]
-            dataframes.append(df)
-        except Exception as e:
-            logging.warning(f"读取 {path} 失败: {e}")
-    if dataframes:
-        merged_df = pd.concat(dataframes, ignore_index=True)
-        merged_df.to_excel(output_file, index=False)
-        logging.info(f"合并后的文件保存为: {output_file}")
-        return output_file
-    else:
-        logging.error("无可合并文件")
-        return None
-
-
-# 拆分文件，按照命名空间拆分，按照实例名称拆分
-def split_excel_by_namespace(source_file: str, output_directory: str):
+# 拆分文件，按照命名空间拆分，按照 routing-rules.json 中的路由规则拆分
+def split_excel_by_namespace(df: pd.DataFrame, output_directory: str, routing_table: RoutingTable, delta_store=None):
+    """拆分并写出 xlsx，返回写出的文件路径；增量模式下只重建内容有变化的文件"""
     try:
-        df = pd.read_excel(source_file)
-
-
-        namespaces = df["命名空间"].unique()
-
-        for namespace in namespaces:
-        # Filter data based on the current namespace
-            filtered_df = df[df['命名空间'] == namespace]
-            # Create a new XLSX file with the filtered data
-            namespace_xlsx_file = os.path.join(output_directory, f"{namespace}.xlsx")
-            filtered_df.to_excel(namespace_xlsx_file, index=False)
-            logging.info(f"已保存 {namespace_xlsx_file}")
-
-
-        # 然后统一根据“影响资产备注名称”关键词筛选
-        keyword_map = {
-            "cnsh-hkcClosedevice": "hkcClosedevice.xlsx",
-            "cnsh-HKCwinnerinf": "HKCwinnerinf.xlsx",
-            "cnsh-ids": "ids.xlsx",
-            "cnsh-JDE": "JDE.xlsx",
-            "cnsh-Enterprise-WeChat": "EnterpriseWeChat.xlsx",
-            "cnsh-MeterSphere": "MeterSphere.xlsx",
-            "cnsh-HMS": "HMS.xlsx",
-            "cnsh-SmartEntry": "SmartEntry.xlsx",
-            "cnsh-Poscenter": "Poscenter.xlsx",
-            "cnsh-HZUS": "ShowSuite.xlsx",
-            "cnsh-jakc": "jakc.xlsx",
-            "cnsh-JDE": "JDE.xlsx",
-            "cnsh-tableau": "tableau.xlsx",
-            "cnsh-bigdata": "bigdata.xlsx",
-            "EMR": "EMR.xlsx",
-            "kbis": "kbis.xlsx",
-            "KO": "KO.xlsx",
-            "KD": "KD.xlsx",
-            "traffic": "traffic.xlsx",
-            "smartpos": "smartpos.xlsx",
-            "KP": "KP.xlsx",
-            "cnsh-oa": "oa.xlsx",
-            "idm": "idm.xlsx",
-   
-        }
-
-        for keyword, filename in keyword_map.items():
-            filtered_df = df[df['影响资产备注名称'].str.contains(keyword, case=False, na=False)]
-            # print(filtered_df)
-            if not filtered_df.empty:
-                output_path = os.path.join(output_directory, filename)
-                filtered_df.to_excel(output_path, index=False)
-                logging.info(f"已保存: {output_path}")
+        # 待写出的文件 {文件路径: 数据}，拆分完成后统一并行写出；同名文件以后面的拆分结果为准
+        outputs = {}
+
+        # 一次 groupby 按命名空间分组，不再对每个命名空间扫描全表
+        if routing_table.split_by_namespace:
+            for namespace, filtered_df in df.groupby("命名空间", sort=False, observed=True):
+                outputs[os.path.join(output_directory, f"{namespace}.xlsx")] = filtered_df
+
+        # 所有路由规则预编译成一个匹配器，对全表只扫描一遍，每行归入它命中的所有文件
+        for filename, rows in routing_table.route(df).items():
+            if rows:
+                outputs[os.path.join(output_directory, filename)] = df.iloc[rows]
             else:
-                logging.warning(f"无匹配数据: {keyword}，未生成 {filename}")
+                logging.warning(f"无匹配数据，未生成 {filename}")
 
+        if delta_store is not None:
+            outputs = delta_store.changed_buckets(outputs)
 
+        # 多进程并行写 xlsx，逐个文件记录耗时
+        return write_xlsx_files(outputs, xlsx_workers)
 
     except Exception as e:
         logging.error(f"[split_excel_by_namespace] 拆分 Excel 失败: {e}")
-
-# 发送邮件
-def send_email(subject, body, attachments, to_email, cc_list=None):
-    msg = MIMEMultipart()
-    msg["From"] = from_email
-    msg["To"] = to_email
-    msg["Subject"] = subject
-    msg["Cc"] = ", ".join(cc_list or [])
-
-    msg.attach(MIMEText(body, "html"))
-
-    for attachment in attachments:
-        with open(attachment, "rb") as f:
-            part = MIMEApplication(f.read(), Name=os.path.basename(attachment))
-            part["Content-Disposition"] = f'attachment; filename="{os.path.basename(attachment)}"'
-            msg.attach(part)
-
+        return []
+
+# 流式拆分：按批读取合并后的数据集（流式合并模式使用），拆分规则同 split_excel_by_namespace
+def split_dataset_by_namespace(dataset_path: str, output_directory: str, routing_table: RoutingTable, delta_store=None):
+    """
+    每批数据按命名空间和路由规则分组后追加写入对应的 xlsx（XlsxAppender 只写模式），内存中同时只有一批数据。
+    与路由规则同名的命名空间文件以路由规则的结果为准。返回写出的文件路径；
+    增量模式下边写边累加各文件的摘要，全部写完后只返回内容有变化的文件。
+    """
     try:
-        server = smtplib.SMTP(smtp_server, smtp_port)
-        server.ehlo()
-        server.starttls()
-        server.login(from_email, email_password)
-        server.sendmail(from_email, [to_email] + (cc_list or []), msg.as_string())
-        server.quit()
-        logging.info("邮件发送成功")
+        route_files = {rule.file for rule in routing_table.rules}
+        writers = {}
+        digests = {}
+        for batch in iter_dataset(dataset_path):
+            parts = {}
+            if routing_table.split_by_namespace:
+                for namespace, filtered_df in batch.groupby("命名空间", sort=False, observed=True):
+                    if f"{namespace}.xlsx" not in route_files:
+                        parts[f"{namespace}.xlsx"] = filtered_df
+            for filename, rows in routing_table.route(batch).items():
+                if rows:
+                    parts[filename] = batch.iloc[rows]
+            for filename, part in parts.items():
+                path = os.path.join(output_directory, filename)
+                if path not in writers:
+                    writers[path] = XlsxAppender(path, batch.columns)
+                    digests[path] = BucketDigest()
+                writers[path].append(part)
+                if delta_store is not None:
+                    digests[path].update(delta_store.row_hashes(part))
+
+        for filename in route_files:
+            if os.path.join(output_directory, filename) not in writers:
+                logging.warning(f"无匹配数据，未生成 {filename}")
+        written = []
+        for writer in writers.values():
+            path, rows, seconds = writer.close()
+            logging.info(f"已保存: {path}（{rows} 行，耗时 {seconds:.2f}s）")
+            written.append(path)
+        if delta_store is not None:
+            changed = set(delta_store.changed_files(digests))
+            written = [path for path in written if path in changed]
+        return written
+
     except Exception as e:
-        logging.error(f"邮件发送失败: {e}")
+        logging.error(f"[split_dataset_by_namespace] 拆分数据集失败: {e}")
+        return []
 
 # 发送拆分后的文件到对应人员
-def send_split_files_from_config(config_path: str = "email_config.json"):
+# only_files 不为 None 时（增量模式）只发送其中的文件，没有变化文件的人员不发送
+# 返回未能发送的文件名集合（有收件人发送失败的文件）
+def send_split_files_from_config(config_path: str = "email_config.json", only_files=None):
     try:
         with open(config_path, "r") as f:
             receivers = json.load(f)
     except Exception as e:
         logging.error(f"加载邮件配置失败: {e}")
-        return
-
-    for name, info in receivers.items():
-        email = info.get("email")
-        file_names = info.get("files", [])
-        cc_list = info.get("cc_list", [])
-
-        file_paths = [
-            os.path.join(output_dir, f) for f in file_names
-            if os.path.exists(os.path.join(output_dir, f))
-        ]
-
-        if not file_paths:
-            logging.warning(f"[{name}] 没有可发送的文件")
-            continue
-
-        subject = f"主题：阿里云安全中心应用漏洞"
-        body = f"Hi {name},<br/><br/>共享一下本周阿里云的安全周报<br/>请查看附件中的阿里云应用漏洞<br/>请及时修复对应的应用漏洞<br/>谢谢配合<br/><p style='color: red;'>温馨提示：此动作是机器人自动发送，请勿回复<p/>Thx"
-
-        try:
-            send_email(subject, body, file_paths, email, cc_list=cc_list)
-            logging.info(f"发送成功: {name} ({email}) -> {file_names}, 抄送: {cc_list}")
-        except Exception as e:
-            logging.error(f"发送失败: {name} ({email}) -> {file_names}，错误：{e}")
-            
-
-# ---------------------------- 主程序入口 ----------------------------
-def main():
-    # 1）.读取AK SK配置文件
-    with open("config.json", "r") as f:
-        configs = json.load(f)
-
-    vul_types = ["app", "emg"]
+        return set(only_files or ())
+
+    failed_files = set()
+    # 整批邮件共用一个 SMTP 会话，附件在多个收件人之间共用
+    with BulkMailer(smtp_server, smtp_port, from_email, email_password, max_per_minute=mail_per_minute) as mailer:
+        for name, info in receivers.items():
+            email = info.get("email")
+            file_names = info.get("files", [])
+            if only_files is not None:
+                file_names = [f for f in file_names if f in only_files]
+            cc_list = info.get("cc_list", [])
+
+            file_paths = [
+                os.path.join(output_dir, f) for f in file_names
+                if os.path.exists(os.path.join(output_dir, f))
+            ]
+
+            if not file_paths:
+                logging.warning(f"[{name}] 没有可发送的文件")
+                continue
+            if journal.mailed(name):
+                logging.info(f"[{name}] 本次运行已发送过，跳过")
+                continue
+
+            subject = "主题：阿里云安全中心应用漏洞"
+            body = f"Hi {name},<br/><br/>共享一下本周阿里云的安全周报<br/>请查看附件中的阿里云应用漏洞<br/>请及时修复对应的应用漏洞<br/>谢谢配合<br/><p style='color: red;'>温馨提示：此动作是机器人自动发送，请勿回复<p/>Thx"
+
+            try:
+                mailer.send(subject, body, file_paths, email, cc_list=cc_list)
+                journal.record_mailed(name)
+                logging.info(f"发送成功: {name} ({email}) -> {file_names}, 抄送: {cc_list}")
+            except Exception as e:
+                logging.error(f"发送失败: {name} ({email}) -> {file_names}，错误：{e}")
+                failed_files.update(file_names)
+        mailer.log_stats()
+    return failed_files
+
+
+# 串行执行：逐个账号、逐个漏洞类型导出 -> 轮询 -> 下载
+def run_serial_exports(configs, vul_types):
     xlsx_files = []
     failed_accounts = []
-
     for account in configs:
         logging.info("当前处理账号配置: %s", json.dumps(account, ensure_ascii=False))
         name = account["name"]
-        ak = account["ak"]
-        sk = account["sk"]
-
         try:
-             # 2）.创建client客户端
-            client = create_client(ak, sk)
+            client = create_client(account)
             for vul_type in vul_types:
                 logging.info(f"[{name}] 开始导出 {vul_type} 类型漏洞")
-                # 3） 导出漏洞（获取任务 ID）
-                export_id = export_vulnerability(client, vul_type)
-                 # 4) 轮询直到导出任务完成，获取下载链接
-                download_url = wait_for_export(client, export_id, f"{name}_{vul_type}")
-                # 5) 下载 .zip 并解压出 .xlsx，返回文件路径
-                xlsx_path = download_xlsx(download_url, f"{name}_{vul_type}")
+                xlsx_path = fetch_export(client, name, vul_type)
                 if xlsx_path:
                     xlsx_files.append(xlsx_path)
         except Exception as e:
             logging.error(f"[{name}] 处理失败: {e}")
             failed_accounts.append(name)
-    # 6). 合并所有 .xlsx 文件为 app_all.xlsx
-    merged_path = os.path.join(output_dir, "app_all.xlsx")
-    merged_file = merge_excels(xlsx_files, merged_path)
+    return xlsx_files, failed_accounts
+
+# 从运行日志中上次完成的阶段继续：复用已下载的文件或未过期的下载链接，
+# 否则提交（或复用）导出任务，轮询直到完成，然后下载 .zip 并解压出 .xlsx
+def fetch_export(client, name, vul_type):
+    xlsx_path, download_url = resume_export(name, vul_type)
+    if xlsx_path:
+        return xlsx_path
+    if download_url is None:
+        download_url = wait_for_export(client, submit_export(client, name, vul_type), f"{name}_{vul_type}")
+    return download_xlsx(download_url, f"{name}_{vul_type}")
+
+# 提交所有 账号 × 漏洞类型 的导出任务，返回 [(账号, 漏洞类型, client, export_id, 已下载的文件, 下载链接)]
+# 运行日志中已下载或有未过期下载链接的不再提交，export_id 为 None
+def submit_exports(configs, vul_types):
+    jobs = []
+    failed_accounts = []
+    for account in configs:
+        name = account["name"]
+        try:
+            client = create_client(account)
+            for vul_type in vul_types:
+                xlsx_path, download_url = resume_export(name, vul_type)
+                export_id = None
+                if not xlsx_path and download_url is None:
+                    export_id = submit_export(client, name, vul_type)
+                jobs.append((name, vul_type, client, export_id, xlsx_path, download_url))
+        except Exception as e:
+            logging.error(f"[{name}] 提交导出任务失败: {e}")
+            failed_accounts.append(name)
+    return jobs, failed_accounts
+
+# 并发执行：一次性提交全部导出任务，再用线程池并行轮询、下载、解压，
+# 总耗时接近最慢的单个导出任务，而不是所有任务耗时之和
+def run_concurrent_exports(configs, vul_types, workers):
+    jobs, failed_accounts = submit_exports(configs, vul_types)
+    results = {}
+    link_futures = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {}
+        for index, (name, vul_type, client, export_id, xlsx_path, download_url) in enumerate(jobs):
+            if xlsx_path:
+                results[index] = xlsx_path
+            elif download_url is not None:
+                futures[executor.submit(download_xlsx, download_url, f"{name}_{vul_type}")] = (index, name)
+            else:
+                # 所有导出任务交给同一个轮询调度器，哪个先完成就先进入线程池下载
+                link_futures[poller.submit(client, export_id, f"{name}_{vul_type}")] = (index, name, vul_type)
+        for link_future in as_completed(link_futures):
+            index, name, vul_type = link_futures[link_future]
+            try:
+                download_url = link_future.result()
+            except Exception as e:
+                logging.error(f"[{name}] 处理失败: {e}")
+                if name not in failed_accounts:
+                    failed_accounts.append(name)
+                continue
+            futures[executor.submit(download_xlsx, download_url, f"{name}_{vul_type}")] = (index, name)
+        for future in as_completed(futures):
+            index, name = futures[future]
+            try:
+                xlsx_path = future.result()
+                if xlsx_path:
+                    results[index] = xlsx_path
+            except Exception as e:
+                logging.error(f"[{name}] 处理失败: {e}")
+                if name not in failed_accounts:
+                    failed_accounts.append(name)
+    # 按提交顺序返回，保证合并结果的行顺序与串行模式一致
+    return [results[index] for index in sorted(results)], failed_accounts
+
+# 协程版本（统一调度入口 run-all-jobs.py 使用）：所有导出任务在同一个事件循环中提交、轮询、下载，
+# SDK 调用和下载通过 run_blocking 交给线程池，等待导出完成时不占线程；同样按运行日志继续
+async def fetch_export_async(account, vul_type, run_blocking):
+    name = account["name"]
+    xlsx_path, download_url = await run_blocking(resume_export, name, vul_type)
+    if xlsx_path:
+        return xlsx_path
+    client = create_client(account)
+    if download_url is None:
+        export_id = await run_blocking(submit_export, client, name, vul_type)
+        download_url = await poller.wait_async(client, export_id, f"{name}_{vul_type}", run_blocking)
+    return await run_blocking(download_xlsx, download_url, f"{name}_{vul_type}")
+
+async def run_async_exports(configs, vul_types, run_blocking):
+    jobs = [(account["name"], vul_type) for account in configs for vul_type in vul_types]
+    results = await asyncio.gather(
+        *(fetch_export_async(account, vul_type, run_blocking) for account in configs for vul_type in vul_types),
+        return_exceptions=True
+    )
+    xlsx_files = []
+    failed_accounts = []
+    # 按提交顺序返回，保证合并结果的行顺序与串行模式一致
+    for (name, vul_type), result in zip(jobs, results):
+        if isinstance(result, BaseException):
+            logging.error(f"[{name}] {vul_type} 处理失败: {result}")
+            if name not in failed_accounts:
+                failed_accounts.append(name)
+        elif result:
+            xlsx_files.append(result)
+    return xlsx_files, failed_accounts
+
+# ---------------------------- 主程序入口 ----------------------------
+def main():
+    # 1）.读取AK SK配置文件
+    with open("config.json", "r") as f:
+        configs = json.load(f)
+
+    vul_types = ["app", "emg"]
+
+    # 2）~ 5）.创建客户端、导出漏洞、轮询导出结果、下载并解压 .xlsx
+    if max_workers > 1:
+        logging.info(f"并发模式处理 {len(configs)} 个账号，并发数: {max_workers}")
+        xlsx_files, failed_accounts = run_concurrent_exports(configs, vul_types, max_workers)
+    else:
+        xlsx_files, failed_accounts = run_serial_exports(configs, vul_types)
+    poller.log_metrics()
+    http_client.log_stats()
+    client_factory.log_stats()
+    publish_results(xlsx_files, failed_accounts)
+
+# 6）~ 8）.合并、拆分下载好的 .xlsx 文件并发送邮件（统一调度入口 run-all-jobs.py 也调用这里）
+def publish_results(xlsx_files, failed_accounts, email_config="email_config.json"):
+    # 增量模式：与上次运行的指纹比较，只重建、发送有变化的拆分文件
+    delta_store = DeltaStore(delta_state_dir) if delta_mode else None
+    split_files = []
+
+    # 6). 合并所有 .xlsx 文件，合并结果以列式格式保存为 app_all.parquet
+    # 内存合并模式拆分直接使用内存中的数据；流式合并模式不把数据集整体读入内存，按批读取后拆分
+    # 运行日志中记录了同一批文件的合并结果时直接使用，不再重新合并
+    merged_df = None
+    merged_path = journal.merged(xlsx_files)
+    if merged_path:
+        logging.info(f"复用运行日志中的合并结果: {merged_path}")
+        if merge_mode != "streaming":
+            merged_df = load_dataset(merged_path)
+    elif merge_mode == "streaming":
+        # 分块写入 app_all.parquet，命名空间、来源账号、漏洞类型为分类列
+        merged_path = merge_excels_chunked(xlsx_files, os.path.join(output_dir, "app_all"))
+        if merged_path:
+            journal.record_merged(xlsx_files, merged_path)
+    else:
+        merged_df = merge_excels(xlsx_files)
+        if merged_df is not None:
+            merged_path = save_dataset(merged_df, os.path.join(output_dir, "app_all"))
+            journal.record_merged(xlsx_files, merged_path)
     # 7). 发送邮件
-    if merged_file:
-       # split_excel_by_namespace(merged_file)
-        # 调用拆分函数：按命名空间 & 特定实例名称
-        split_excel_by_namespace(merged_file, output_dir)
+    if merged_path:
+        if delta_store is not None:
+            delta_store.diff_batches([merged_df] if merged_df is not None else iter_dataset(merged_path))
+        # 调用拆分函数：按命名空间 & 特定实例名称，只有拆分出的邮件附件才渲染成 xlsx
+        # 拆分过的文件都还在时直接复用；增量模式需要重新计算各文件的摘要，总是重新拆分
+        split_files = journal.split_files() if delta_store is None else None
+        if split_files is None:
+            routing_table = RoutingTable.load(routing_rules_file)
+            if merged_df is not None:
+                split_files = split_excel_by_namespace(merged_df, output_dir, routing_table, delta_store)
+            else:
+                split_files = split_dataset_by_namespace(merged_path, output_dir, routing_table, delta_store)
+            if split_files:
+                journal.record_split(split_files)
+        else:
+            logging.info(f"复用运行日志中的 {len(split_files)} 个拆分文件")
         # subject = "主题：阿里云安全中心应用漏洞数据（合并）"
         # body = (
         #     f"Hi Y,<br/><br/>请查看多账号合并后的阿里云应用漏洞数据。<br/>"
@@ -281,10 +452,23 @@ def main():
         # )
         # send_email(subject, body, [merged_file], to_email, cc_list)
     # 8). 从外部读取配置文件，发送邮件
-    send_split_files_from_config("email_config.json")
+    if delta_store is not None:
+        written = {os.path.basename(path) for path in split_files}
+        failed_files = send_split_files_from_config(email_config, written)
+        # 只保存已写出并发送成功的文件摘要，写出或发送失败的文件下次运行重新发送
+        delta_store.commit(written - failed_files)
+        delta_store.save()
+    else:
+        failed_files = send_split_files_from_config(email_config)
 
     if failed_accounts:
         logging.warning("以下账号处理失败: " + ", ".join(failed_accounts))
+    if failed_accounts or failed_files:
+        # 保留运行日志：再次运行时只重新处理失败的账号，已下载的文件直接复用，已发送的收件人不再重复发送
+        logging.warning(f"本次运行未全部完成，运行日志保留在 {journal.path}，再次运行时从失败处继续")
+    else:
+        # 全部账号处理完成、邮件全部发送成功，下次运行重新开始
+        journal.finish()
 
 if __name__ == '__main__':
     main()
@@ -1,23 +1,27 @@
 import os
+import sys
 import json
-import time
 import smtplib
-import zipfile
 import logging
-import requests
-import pandas as pd
-from io import BytesIO
-from typing import List
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from email.mime.application import MIMEApplication
 
 
-from alibabacloud_sas20181203.client import Client as Sas20181203Client
-from alibabacloud_tea_openapi import models as open_api_models
 from alibabacloud_sas20181203 import models as sas_20181203_models
 from alibabacloud_tea_util import models as util_models
 
+# 仓库根目录下的共用模块 aliyun_common（镜像中与脚本放在同一目录）
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from aliyun_common import client_factory, credential_from_config
+
+from export_poller import ExportPoller, FAILED_STATUSES
+from download_client import DownloadClient
+from vul_dataset import merge_excels, merge_excels_chunked, save_dataset, load_dataset, iter_dataset
+from xlsx_writer import write_xlsx_batches
+from run_journal import RunJournal
+
 # 邮件配置
 smtp_server = "smtpdm.aliyun.com"  # 固定地址，勿改
 smtp_port = 80                   # 非加密端口
@@ -26,6 +30,17 @@ email_password = "********"         # SMTP密码
 to_email = "barry.jiang@*****.com"
 cc_list = ["barry.jiang@*******.com"]
 
+# 并发配置：同时轮询/下载的导出任务数，设为 1 时按原串行方式逐个处理
+max_workers = int(os.environ.get("VUL_EXPORT_WORKERS", "8"))
+# 导出任务总超时（秒），从提交导出任务开始计算
+export_deadline = int(os.environ.get("VUL_EXPORT_DEADLINE", "3600"))
+# 合并方式：memory 一次读入全部文件后合并；streaming 分块读取、边读边写入数据集，峰值内存不随账号数增长
+merge_mode = os.environ.get("VUL_MERGE_MODE", "memory")
+# 运行日志：中断后重新运行时从上次完成的阶段继续，与拆分脚本的运行日志分开，需与下载的文件一起放在持久化目录
+journal_file = os.environ.get("VUL_MERGE_JOURNAL_FILE", "")
+journal_max_age = int(os.environ.get("VUL_JOURNAL_MAX_AGE", "86400"))  # 超过该时间（秒）未完成的运行不再继续
+journal_link_ttl = int(os.environ.get("VUL_JOURNAL_LINK_TTL", "1800"))  # 下载链接按该时间（秒）视为有效
+
 
 # 日志与输出目录
 output_dir = os.path.join(os.path.dirname(__file__), "log")
@@ -40,13 +55,26 @@ logging.basicConfig(
     ]
 )
 
-def create_client(ak, sk):
-    config = open_api_models.Config(
-        access_key_id=ak,
-        access_key_secret=sk
-    )
-    config.endpoint = 'tds.aliyuncs.com'
-    return Sas20181203Client(config)
+journal = RunJournal(
+    journal_file or os.path.join(output_dir, "merge-run-journal.json"),
+    max_age=journal_max_age,
+    link_ttl=journal_link_ttl,
+)
+
+# 集中轮询调度器：所有导出任务共用，自适应退避 + 总超时
+poller = ExportPoller(deadline=export_deadline)
+
+# 共享下载客户端：连接池复用 + 连接/读取超时 + 5xx 与连接错误指数退避重试
+http_client = DownloadClient(
+    pool_size=max(max_workers, 10),
+    connect_timeout=int(os.environ.get("VUL_DOWNLOAD_CONNECT_TIMEOUT", "10")),
+    read_timeout=int(os.environ.get("VUL_DOWNLOAD_READ_TIMEOUT", "120")),
+)
+
+def create_client(account):
+    # 同一账号只创建一次客户端，支持 AK/SK 和 RAM 角色（role_arn）两种配置
+    client_factory.add_account(account["name"], credential_from_config(account))
+    return client_factory.client(account["name"], "sas", "tds.aliyuncs.com")
 
 def export_vulnerability(client, vul_type):
     request = sas_20181203_models.ExportVulRequest(
@@ -58,57 +86,51 @@ def export_vulnerability(client, vul_type):
     result = client.export_vul_with_options(request, util_models.RuntimeOptions())
     return result.body.id
 
-def wait_for_export(client, export_id, name):
-    for _ in range(60):
+# 提交导出任务；运行日志中有仍可查询的导出任务时直接复用，不再重新导出
+def submit_export(client, name, vul_type):
+    key = f"{name}_{vul_type}"
+    export_id = journal.export_id(key)
+    if export_id is not None:
         try:
             request = sas_20181203_models.DescribeVulExportInfoRequest(export_id=export_id)
             result = client.describe_vul_export_info_with_options(request, util_models.RuntimeOptions())
-            if result.body.export_status == "success":
-                logging.info(f"[{name}] 导出成功: {result.body.link}")
-                return result.body.link
+            if result.body.export_status not in FAILED_STATUSES:
+                logging.info(f"[{name}] 复用 {vul_type} 类型漏洞导出任务: {export_id}")
+                return export_id
         except Exception as e:
-            logging.warning(f"[{name}] 查询导出状态失败: {e}")
-        time.sleep(15)
-    raise TimeoutError(f"[{name}] 导出超时")
+            logging.warning(f"[{name}] 导出任务 {export_id} 已不可用，重新提交: {e}")
+    export_id = export_vulnerability(client, vul_type)
+    journal.record_submitted(key, export_id)
+    logging.info(f"[{name}] 已提交 {vul_type} 类型漏洞导出任务: {export_id}")
+    return export_id
+
+# 运行日志中已有的阶段：返回 (已下载的文件, 未过期的下载链接)，都没有时需要提交导出任务
+def resume_export(name, vul_type):
+    key = f"{name}_{vul_type}"
+    xlsx_path = journal.downloaded(key)
+    if xlsx_path:
+        logging.info(f"[{name}] 复用已下载的 {vul_type} 类型漏洞文件: {xlsx_path}")
+        return xlsx_path, None
+    return None, journal.link(key)
+
+def wait_for_export(client, export_id, name):
+    return poller.wait(client, export_id, name)
 
 def download_xlsx(url, name):
+    journal.record_linked(name, url)
     try:
-        response = requests.get(url)
-        if response.status_code == 200:
-            with zipfile.ZipFile(BytesIO(response.content), 'r') as zip_ref:
-                for file_info in zip_ref.infolist():
-                    if file_info.filename.endswith(".xlsx"):
-                        zip_ref.extract(file_info, output_dir)
-                        extracted_path = os.path.join(output_dir, file_info.filename)
-                        renamed_path = os.path.join(output_dir, f"{name}_{file_info.filename}")
-                        os.rename(extracted_path, renamed_path)
-                        return renamed_path
-        logging.error(f"[{name}] 下载失败，状态码: {response.status_code}")
+        # 分块流式下载到临时文件（支持断点续传），校验后直接解压到 {name}_{文件名}
+        xlsx_path = http_client.download_and_extract(url, name, output_dir)
+        if xlsx_path:
+            journal.record_downloaded(name, xlsx_path)
+            return xlsx_path
+        logging.error(f"[{name}] 压缩包中没有 .xlsx 文件")
     except Exception as e:
-        logging.error(f"[{name}] 解压失败: {e}")
+        logging.error(f"[{name}] 下载或解压失败: {e}")
+    # 链接可能已失效，下次运行重新查询导出任务
+    journal.discard_link(name)
     return None
 
-def merge_excels(file_paths: List[str], output_file: str):
-    dataframes = []
-    for path in file_paths:
-        try:
-            df = pd.read_excel(path)
-            basename = os.path.basename(path)
-            parts = basename.split("_")
-            df["来源账号"] = parts[0]
-            df["漏洞类型"] = parts[1]
-            dataframes.append(df)
-        except Exception as e:
-            logging.warning(f"读取 {path} 失败: {e}")
-    if dataframes:
-        merged_df = pd.concat(dataframes, ignore_index=True)
-        merged_df.to_excel(output_file, index=False)
-        logging.info(f"合并后的文件保存为: {output_file}")
-        return output_file
-    else:
-        logging.error("无可合并文件")
-        return None
-
 def send_email(subject, body, attachments, to_email, cc_list=None):
     msg = MIMEMultipart()
     msg["From"] = from_email
@@ -132,59 +154,168 @@ def send_email(subject, body, attachments, to_email, cc_list=None):
         server.sendmail(from_email, [to_email] + (cc_list or []), msg.as_string())
         server.quit()
         logging.info("邮件发送成功")
+        return True
     except Exception as e:
         logging.error(f"邮件发送失败: {e}")
+        return False
 
-def main():
-    # 读取AK SK配置文件
-    with open("config.json", "r") as f:
-        configs = json.load(f)
-
-    vul_types = ["app", "emg"]  # 可拓展支持更多类型，如 web、linux 等
+# 串行执行：逐个账号、逐个漏洞类型导出 -> 轮询 -> 下载
+def run_serial_exports(configs, vul_types):
     xlsx_files = []
     failed_accounts = []
-
     for account in configs:
-        print(account)
         logging.info("当前处理账号配置: %s", json.dumps(account, ensure_ascii=False))
         name = account["name"]
-        ak = account["ak"]
-        sk = account["sk"]
-        logging.info(f"开始处理账号: {name}")
-        
         try:
-            # 创建client客户端
-            client = create_client(ak, sk)
+            client = create_client(account)
             for vul_type in vul_types:
                 logging.info(f"[{name}] 开始导出 {vul_type} 类型漏洞")
-                # 3. 导出漏洞（获取任务 ID）
-                export_id = export_vulnerability(client, vul_type)
-                # 4. 轮询直到导出任务完成，获取下载链接
-                download_url = wait_for_export(client, export_id, f"{name}_{vul_type}")
-                # 5. 下载 .zip 并解压出 .xlsx，返回文件路径
-                xlsx_path = download_xlsx(download_url, f"{name}_{vul_type}")
+                xlsx_path = fetch_export(client, name, vul_type)
                 if xlsx_path:
                     xlsx_files.append(xlsx_path)
         except Exception as e:
             logging.error(f"[{name}] 处理失败: {e}")
             failed_accounts.append(name)
+    return xlsx_files, failed_accounts
+
+# 从运行日志中上次完成的阶段继续：复用已下载的文件或未过期的下载链接，
+# 否则提交（或复用）导出任务，轮询直到完成，然后下载 .zip 并解压出 .xlsx
+def fetch_export(client, name, vul_type):
+    xlsx_path, download_url = resume_export(name, vul_type)
+    if xlsx_path:
+        return xlsx_path
+    if download_url is None:
+        download_url = wait_for_export(client, submit_export(client, name, vul_type), f"{name}_{vul_type}")
+    return download_xlsx(download_url, f"{name}_{vul_type}")
+
+# 提交所有 账号 × 漏洞类型 的导出任务，返回 [(账号, 漏洞类型, client, export_id, 已下载的文件, 下载链接)]
+# 运行日志中已下载或有未过期下载链接的不再提交，export_id 为 None
+def submit_exports(configs, vul_types):
+    jobs = []
+    failed_accounts = []
+    for account in configs:
+        name = account["name"]
+        try:
+            client = create_client(account)
+            for vul_type in vul_types:
+                xlsx_path, download_url = resume_export(name, vul_type)
+                export_id = None
+                if not xlsx_path and download_url is None:
+                    export_id = submit_export(client, name, vul_type)
+                jobs.append((name, vul_type, client, export_id, xlsx_path, download_url))
+        except Exception as e:
+            logging.error(f"[{name}] 提交导出任务失败: {e}")
+            failed_accounts.append(name)
+    return jobs, failed_accounts
 
-    # 6. 合并所有 .xlsx 文件为 app_all.xlsx
-    merged_path = os.path.join(output_dir, "app_all.xlsx")
-    merged_file = merge_excels(xlsx_files, merged_path)
+# 并发执行：一次性提交全部导出任务，再用线程池并行轮询、下载、解压，
+# 总耗时接近最慢的单个导出任务，而不是所有任务耗时之和
+def run_concurrent_exports(configs, vul_types, workers):
+    jobs, failed_accounts = submit_exports(configs, vul_types)
+    results = {}
+    link_futures = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {}
+        for index, (name, vul_type, client, export_id, xlsx_path, download_url) in enumerate(jobs):
+            if xlsx_path:
+                results[index] = xlsx_path
+            elif download_url is not None:
+                futures[executor.submit(download_xlsx, download_url, f"{name}_{vul_type}")] = (index, name)
+            else:
+                # 所有导出任务交给同一个轮询调度器，哪个先完成就先进入线程池下载
+                link_futures[poller.submit(client, export_id, f"{name}_{vul_type}")] = (index, name, vul_type)
+        for link_future in as_completed(link_futures):
+            index, name, vul_type = link_futures[link_future]
+            try:
+                download_url = link_future.result()
+            except Exception as e:
+                logging.error(f"[{name}] 处理失败: {e}")
+                if name not in failed_accounts:
+                    failed_accounts.append(name)
+                continue
+            futures[executor.submit(download_xlsx, download_url, f"{name}_{vul_type}")] = (index, name)
+        for future in as_completed(futures):
+            index, name = futures[future]
+            try:
+                xlsx_path = future.result()
+                if xlsx_path:
+                    results[index] = xlsx_path
+            except Exception as e:
+                logging.error(f"[{name}] 处理失败: {e}")
+                if name not in failed_accounts:
+                    failed_accounts.append(name)
+    # 按提交顺序返回，保证合并结果的行顺序与串行模式一致
+    return [results[index] for index in sorted(results)], failed_accounts
 
-    # 7. 发邮件附上合并文件
-    if merged_file:
+def main():
+    # 读取AK SK配置文件
+    with open("config.json", "r") as f:
+        configs = json.load(f)
+
+    vul_types = ["app", "emg"]  # 可拓展支持更多类型，如 web、linux 等
+
+    if max_workers > 1:
+        logging.info(f"并发模式处理 {len(configs)} 个账号，并发数: {max_workers}")
+        xlsx_files, failed_accounts = run_concurrent_exports(configs, vul_types, max_workers)
+    else:
+        xlsx_files, failed_accounts = run_serial_exports(configs, vul_types)
+    poller.log_metrics()
+    http_client.log_stats()
+    client_factory.log_stats()
+
+    # 6. 合并所有 .xlsx 文件，合并结果以列式格式保存为 app_all.parquet
+    # 7. 只有邮件附件才渲染成 xlsx；流式合并模式按批读取数据集，以只写模式逐批追加到 app_all.xlsx，不把数据集整体读入内存
+    # 运行日志中记录了同一批文件的合并结果和渲染好的附件时直接使用，不再重新合并、渲染
+    merged_file = os.path.join(output_dir, "app_all.xlsx")
+    merged_path = journal.merged(xlsx_files)
+    rendered = journal.split_files() if merged_path else None
+    if rendered:
+        logging.info(f"复用运行日志中的合并结果: {merged_path}")
+        merged_file = rendered[0]
+    elif merge_mode == "streaming":
+        if not merged_path:
+            merged_path = merge_excels_chunked(xlsx_files, os.path.join(output_dir, "app_all"))
+            if merged_path:
+                journal.record_merged(xlsx_files, merged_path)
+        merged_file = write_xlsx_batches(iter_dataset(merged_path), merged_file) if merged_path else None
+    else:
+        if merged_path:
+            merged_df = load_dataset(merged_path)
+        else:
+            merged_df = merge_excels(xlsx_files)
+            if merged_df is not None:
+                merged_path = save_dataset(merged_df, os.path.join(output_dir, "app_all"))
+                journal.record_merged(xlsx_files, merged_path)
+        if merged_df is None:
+            merged_file = None
+        else:
+            merged_df.to_excel(merged_file, index=False)
+    if merged_file and not rendered:
+        journal.record_split([merged_file])
+
+    # 发邮件附上合并文件，本次运行已发送过时不再重复发送
+    mailed = journal.mailed(to_email)
+    if merged_file and not mailed:
         subject = "主题：阿里云安全中心应用漏洞数据（合并）"
         body = (
-            f"Hi ******,<br/><br/>请查看多账号合并后的阿里云应用漏洞数据。<br/>"
-            f"来自多个账号和类型漏洞文件合并<br/>"
-            f"请及时处理，谢谢！<br/><p style='color: red;'>此为自动发送，请勿回复。</p>"
+            "Hi ******,<br/><br/>请查看多账号合并后的阿里云应用漏洞数据。<br/>"
+            "来自多个账号和类型漏洞文件合并<br/>"
+            "请及时处理，谢谢！<br/><p style='color: red;'>此为自动发送，请勿回复。</p>"
         )
-        send_email(subject, body, [merged_file], to_email, cc_list)
+        mailed = send_email(subject, body, [merged_file], to_email, cc_list)
+        if mailed:
+            journal.record_mailed(to_email)
+    elif mailed:
+        logging.info(f"本次运行已发送过合并文件给 {to_email}，跳过")
 
     if failed_accounts:
         logging.warning("以下账号处理失败: " + ", ".join(failed_accounts))
+    if failed_accounts or (merged_file and not mailed):
+        # 保留运行日志：再次运行时只重新处理失败的账号，已下载的文件直接复用
+        logging.warning(f"本次运行未全部完成，运行日志保留在 {journal.path}，再次运行时从失败处继续")
+    else:
+        # 全部账号处理完成、邮件发送成功，下次运行重新开始
+        journal.finish()
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,121 @@
+import os
+import time
+import smtplib
+import logging
+from email.mime.text import MIMEText
+from email.mime.multipart import MIMEMultipart
+from email.mime.application import MIMEApplication
+
+
+def _retryable(error):
+    """连接错误和 4xx 临时错误可以重试，5xx 永久错误不重试"""
+    if isinstance(error, smtplib.SMTPResponseException):
+        return 400 <= error.smtp_code < 500
+    return True
+
+
+class BulkMailer:
+    """
+    批量发送邮件：整批邮件共用一个已登录的 SMTP 会话。
+
+    - 只做一次 EHLO/STARTTLS/登录，连接断开、连接错误或 4xx 临时错误时自动重连并重发；
+      5xx 永久错误（如 550 收件人不存在、552 超出大小限制）重发也不会成功，直接抛出
+    - max_per_minute 限制发送速率，避免被中继服务器限流
+    - 同一个附件只读一次磁盘、只编码一次，多个收件人共用
+    - 记录每封邮件的发送耗时
+    """
+
+    def __init__(self, smtp_server, smtp_port, from_email, password, starttls=True, max_per_minute=30, retries=2):
+        self.smtp_server = smtp_server
+        self.smtp_port = smtp_port
+        self.from_email = from_email
+        self.password = password
+        self.starttls = starttls
+        self.min_interval = 60 / max_per_minute if max_per_minute else 0
+        self.retries = retries
+        self.latencies = []
+        self._server = None
+        self._last_sent = 0
+        self._parts = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _connect(self):
+        self.close()
+        server = smtplib.SMTP(self.smtp_server, self.smtp_port, timeout=60)
+        server.ehlo()
+        if self.starttls:
+            server.starttls()
+            server.ehlo()
+        server.login(self.from_email, self.password)
+        self._server = server
+        logging.info(f"已连接 SMTP 服务器: {self.smtp_server}:{self.smtp_port}")
+
+    def close(self):
+        if self._server is not None:
+            try:
+                self._server.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._server = None
+
+    def _attachment_part(self, path):
+        """读取并编码附件，按（路径, 修改时间, 大小）缓存"""
+        stat = os.stat(path)
+        key = (path, stat.st_mtime, stat.st_size)
+        part = self._parts.get(key)
+        if part is None:
+            with open(path, "rb") as f:
+                part = MIMEApplication(f.read(), Name=os.path.basename(path))
+            part["Content-Disposition"] = f'attachment; filename="{os.path.basename(path)}"'
+            self._parts[key] = part
+        return part
+
+    def _throttle(self):
+        wait = self._last_sent + self.min_interval - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+
+    def send(self, subject, body, attachments, to_email, cc_list=None):
+        """发送一封 HTML 邮件，失败时重连重试，最终失败抛出异常；返回发送耗时（秒）"""
+        msg = MIMEMultipart()
+        msg["From"] = self.from_email
+        msg["To"] = to_email
+        msg["Subject"] = subject
+        msg["Cc"] = ", ".join(cc_list or [])
+        msg.attach(MIMEText(body, "html"))
+        for attachment in attachments:
+            msg.attach(self._attachment_part(attachment))
+        message = msg.as_string()
+
+        self._throttle()
+        started = time.monotonic()
+        for attempt in range(self.retries + 1):
+            try:
+                if self._server is None:
+                    self._connect()
+                self._server.sendmail(self.from_email, [to_email] + (cc_list or []), message)
+                break
+            except (smtplib.SMTPServerDisconnected, smtplib.SMTPResponseException, OSError) as e:
+                if attempt == self.retries or not _retryable(e):
+                    raise
+                logging.warning(f"邮件发送失败（第 {attempt + 1} 次），重连后重试: {e}")
+                self.close()
+        self._last_sent = time.monotonic()
+        latency = self._last_sent - started
+        self.latencies.append(latency)
+        logging.info(f"邮件发送成功: {to_email}，耗时 {latency:.2f}s")
+        return latency
+
+    def log_stats(self):
+        """输出本批邮件的发送耗时统计"""
+        if self.latencies:
+            latencies = sorted(self.latencies)
+            logging.info(
+                f"本批共发送 {len(latencies)} 封邮件, "
+                f"中位耗时 {latencies[len(latencies) // 2]:.2f}s, 最长 {latencies[-1]:.2f}s"
+            )
@@ -0,0 +1,145 @@
+import os
+import re
+import time
+import shutil
+import zipfile
+import logging
+import threading
+import requests
+from urllib.parse import urlparse
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+CHUNK_SIZE = 1024 * 1024  # 每次写盘 1MB，内存占用与压缩包大小无关
+
+
+def _expected_size(response, offset):
+    """从响应头推算下载完成后的文件总大小，无法判断时返回 None"""
+    if response.headers.get("Content-Encoding"):
+        return None
+    if response.status_code == 206:
+        match = re.match(r"bytes \d+-\d+/(\d+)", response.headers.get("Content-Range", ""))
+        return int(match.group(1)) if match else None
+    length = response.headers.get("Content-Length")
+    return offset + int(length) if length else None
+
+
+def extract_xlsx(zip_path, name, output_dir):
+    """从压缩包中流式解压第一个 .xlsx 到 {name}_{文件名}，校验大小和 CRC，返回文件路径"""
+    with zipfile.ZipFile(zip_path, "r") as zip_ref:
+        for file_info in zip_ref.infolist():
+            if not file_info.filename.endswith(".xlsx"):
+                continue
+            target_path = os.path.join(output_dir, f"{name}_{os.path.basename(file_info.filename)}")
+            try:
+                # ZipExtFile 读到末尾时会校验 CRC-32，不一致抛出 BadZipFile
+                with zip_ref.open(file_info) as src, open(target_path, "wb") as dst:
+                    shutil.copyfileobj(src, dst, CHUNK_SIZE)
+                if os.path.getsize(target_path) != file_info.file_size:
+                    raise zipfile.BadZipFile(f"{file_info.filename} 解压大小不一致")
+            except Exception:
+                if os.path.exists(target_path):
+                    os.remove(target_path)
+                raise
+            return target_path
+    return None
+
+
+class DownloadClient:
+    """
+    所有导出下载共用的 HTTP 客户端。
+
+    - 一个 requests.Session 复用连接池（keep-alive），同一 OSS 域名只做一次 TLS 握手
+    - 连接/读取超时分开配置，避免单个慢连接卡住整个任务
+    - 连接错误和 5xx 按指数退避自动重试，下载中途断开则用 Range 续传
+    - 按域名统计请求数、字节数和吞吐
+    """
+
+    def __init__(self, pool_size=10, connect_timeout=10, read_timeout=120, retries=3, backoff=1.0):
+        self.timeout = (connect_timeout, read_timeout)
+        self.retries = retries
+        self.backoff = backoff
+        retry = Retry(
+            total=retries,
+            connect=retries,
+            read=retries,
+            status=retries,
+            backoff_factor=backoff,
+            status_forcelist=(500, 502, 503, 504),
+            allowed_methods=("GET",),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.stats = {}
+        self._lock = threading.Lock()
+
+    def _record(self, url, size, seconds):
+        host = urlparse(url).netloc
+        with self._lock:
+            stat = self.stats.setdefault(host, {"requests": 0, "bytes": 0, "seconds": 0.0})
+            stat["requests"] += 1
+            stat["bytes"] += size
+            stat["seconds"] += seconds
+
+    def log_stats(self):
+        """输出每个域名的下载吞吐统计"""
+        for host, stat in self.stats.items():
+            rate = stat["bytes"] / stat["seconds"] / 1024 / 1024 if stat["seconds"] else 0
+            logging.info(
+                f"[{host}] 下载 {stat['requests']} 次, 共 {stat['bytes'] / 1024 / 1024:.1f}MB, "
+                f"耗时 {stat['seconds']:.1f}s, 吞吐 {rate:.2f}MB/s"
+            )
+
+    def stream_download(self, url, path, chunk_size=CHUNK_SIZE):
+        """分块下载到 path，连接中断后按指数退避用 HTTP Range 从已下载位置续传，返回文件大小"""
+        for attempt in range(1, self.retries + 1):
+            offset = os.path.getsize(path) if os.path.exists(path) else 0
+            headers = {"Range": f"bytes={offset}-"} if offset else {}
+            started = time.monotonic()
+            try:
+                with self.session.get(url, headers=headers, stream=True, timeout=self.timeout) as response:
+                    if response.status_code == 416:
+                        # 本地文件已不小于远端文件：大小一致视为下载完成，否则丢弃重下
+                        match = re.match(r"bytes \*/(\d+)", response.headers.get("Content-Range", ""))
+                        if match and int(match.group(1)) == offset:
+                            return offset
+                        os.remove(path)
+                        raise IOError(f"续传位置无效: {offset}")
+                    response.raise_for_status()
+                    if response.status_code == 200:
+                        # 服务端忽略了 Range，从头下载
+                        offset = 0
+                    expected = _expected_size(response, offset)
+                    with open(path, "ab" if offset else "wb") as f:
+                        for chunk in response.iter_content(chunk_size):
+                            f.write(chunk)
+                size = os.path.getsize(path)
+                self._record(url, size - offset, time.monotonic() - started)
+                if expected is not None and size != expected:
+                    if size > expected:
+                        os.remove(path)
+                    raise IOError(f"文件大小不一致: 期望 {expected}，实际 {size}")
+                return size
+            except (requests.RequestException, IOError) as e:
+                if attempt == self.retries:
+                    raise
+                delay = self.backoff * 2 ** (attempt - 1)
+                logging.warning(f"下载中断（第 {attempt} 次），{delay:.0f}s 后续传: {e}")
+                time.sleep(delay)
+
+    def download_and_extract(self, url, name, output_dir):
+        """流式下载导出压缩包到临时文件，再直接解压出 .xlsx，返回文件路径"""
+        part_path = os.path.join(output_dir, f"{name}.zip.part")
+        if os.path.exists(part_path):
+            # 上一次运行残留的临时文件对应的是旧的导出链接，不能续传
+            os.remove(part_path)
+        try:
+            size = self.stream_download(url, part_path)
+            logging.info(f"[{name}] 下载完成: {size / 1024 / 1024:.1f}MB")
+            return extract_xlsx(part_path, name, output_dir)
+        finally:
+            if os.path.exists(part_path):
+                os.remove(part_path)
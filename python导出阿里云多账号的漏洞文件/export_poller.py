@@ -0,0 +1,172 @@
+import time
+import heapq
+import asyncio
+import random
+import logging
+import itertools
+import threading
+from concurrent.futures import Future
+
+from alibabacloud_sas20181203 import models as sas_20181203_models
+from alibabacloud_tea_util import models as util_models
+
+from aliyun_common import no_retry
+
+# 导出任务的终止失败状态，出现后不再轮询
+FAILED_STATUSES = ("failed",)
+
+
+class ExportJob:
+    """一个待完成的导出任务及其轮询状态"""
+
+    def __init__(self, client, export_id, name, deadline, interval):
+        self.client = client
+        self.export_id = export_id
+        self.name = name
+        self.future = Future()
+        self.submitted_at = time.monotonic()
+        self.deadline = self.submitted_at + deadline
+        self.interval = interval
+        self.progress = 0
+        self.progress_at = self.submitted_at
+        self.polls = 0
+
+
+class ExportPoller:
+    """
+    集中调度所有未完成导出任务的 DescribeVulExportInfo 轮询。
+
+    - 每个任务单独维护下次检查时间，无进展时按 backoff 倍数退避（上限 max_interval），并叠加随机抖动
+    - 接口返回进度变化时，按进度速率估算剩余时间，提前检查
+    - 以总超时 deadline（秒，从提交开始计算）代替固定重试次数
+    - 查询接口不经调用层退避重试（no_retry），失败时按退避间隔重新排期，轮询线程不会被重试的 sleep 阻塞
+    - 记录每个导出任务的耗时和轮询次数
+    """
+
+    def __init__(self, deadline=3600, min_interval=2, max_interval=30, backoff=1.5, jitter=0.2):
+        self.deadline = deadline
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.jitter = jitter
+        self.runtime = util_models.RuntimeOptions()
+        self.metrics = []
+        self._heap = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def submit(self, client, export_id, name):
+        """登记导出任务，返回 Future，完成时结果为下载链接"""
+        job = ExportJob(client, export_id, name, self.deadline, self.min_interval)
+        with self._cond:
+            self._schedule(job, job.submitted_at + self.min_interval)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="export-poller", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+        return job.future
+
+    def wait(self, client, export_id, name):
+        """登记导出任务并阻塞等待下载链接"""
+        return self.submit(client, export_id, name).result()
+
+    async def wait_async(self, client, export_id, name, run_blocking):
+        """
+        协程版本：在调用方的事件循环中轮询，等待期间不占线程，返回下载链接。
+        run_blocking 用于在线程池中执行查询接口（如 Orchestrator.blocking），退避策略和耗时统计与 submit() 相同。
+        """
+        job = ExportJob(client, export_id, name, self.deadline, self.min_interval)
+        due_at = job.submitted_at + self.min_interval
+        while due_at is not None:
+            await asyncio.sleep(max(0, due_at - time.monotonic()))
+            due_at = await run_blocking(self._poll, job)
+        return job.future.result()
+
+    def log_metrics(self):
+        """输出所有已结束导出任务的耗时统计"""
+        latencies = sorted(m["latency"] for m in self.metrics if m["status"] == "success")
+        if latencies:
+            logging.info(
+                f"导出任务耗时统计: 成功 {len(latencies)} 个, "
+                f"中位数 {latencies[len(latencies) // 2]:.1f}s, 最长 {latencies[-1]:.1f}s, "
+                f"总轮询 {sum(m['polls'] for m in self.metrics)} 次"
+            )
+        for m in self.metrics:
+            if m["status"] != "success":
+                logging.warning(f"[{m['name']}] 导出未完成: {m['status']}，已等待 {m['latency']:.1f}s")
+
+    def _schedule(self, job, due_at):
+        heapq.heappush(self._heap, (due_at, next(self._seq), job))
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._heap:
+                    self._thread = None
+                    return
+                now = time.monotonic()
+                if self._heap[0][0] > now:
+                    self._cond.wait(self._heap[0][0] - now)
+                    continue
+                # 一次取出所有已到期的任务，批量检查
+                due = []
+                while self._heap and self._heap[0][0] <= now:
+                    due.append(heapq.heappop(self._heap)[2])
+            for job in due:
+                due_at = self._poll(job)
+                if due_at is not None:
+                    with self._cond:
+                        self._schedule(job, due_at)
+
+    def _poll(self, job):
+        """检查一次导出状态，返回下次检查时间；任务结束时返回 None"""
+        job.polls += 1
+        progress = job.progress
+        try:
+            request = sas_20181203_models.DescribeVulExportInfoRequest(export_id=job.export_id)
+            with no_retry():
+                result = job.client.describe_vul_export_info_with_options(request, self.runtime)
+            if result.body.export_status == "success":
+                self._finish(job, "success")
+                logging.info(f"[{job.name}] 导出成功: {result.body.link}")
+                job.future.set_result(result.body.link)
+                return None
+            if result.body.export_status in FAILED_STATUSES:
+                self._finish(job, result.body.export_status)
+                job.future.set_exception(RuntimeError(f"[{job.name}] 导出失败: {result.body.export_status}"))
+                return None
+            progress = result.body.progress or 0
+        except Exception as e:
+            logging.warning(f"[{job.name}] 查询导出状态失败: {e}")
+
+        now = time.monotonic()
+        if now >= job.deadline:
+            self._finish(job, "timeout")
+            job.future.set_exception(TimeoutError(f"[{job.name}] 导出超时"))
+            return None
+        return now + self._next_delay(job, progress, now)
+
+    def _next_delay(self, job, progress, now):
+        if progress > job.progress:
+            # 有进展：按进度速率估算剩余时间，并重置退避间隔
+            rate = (progress - job.progress) / max(now - job.progress_at, 1e-3)
+            delay = min((100 - progress) / rate, self.max_interval)
+            job.progress, job.progress_at = progress, now
+            job.interval = self.min_interval
+        else:
+            job.interval = min(job.interval * self.backoff, self.max_interval)
+            delay = job.interval
+        delay *= random.uniform(1 - self.jitter, 1 + self.jitter)
+        return max(self.min_interval, min(delay, job.deadline - now))
+
+    def _finish(self, job, status):
+        latency = time.monotonic() - job.submitted_at
+        self.metrics.append({
+            "name": job.name,
+            "export_id": job.export_id,
+            "status": status,
+            "latency": latency,
+            "polls": job.polls,
+        })
+        logging.info(f"[{job.name}] 导出任务结束: {status}，耗时 {latency:.1f}s，轮询 {job.polls} 次")
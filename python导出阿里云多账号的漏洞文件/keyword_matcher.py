@@ -0,0 +1,70 @@
+from collections import deque
+
+
+class KeywordMatcher:
+    """
+    Aho-Corasick 自动机：对文本扫描一遍，找出其中出现的所有关键词（子串匹配，默认忽略大小写）。
+    匹配耗时只与文本长度有关，与关键词数量无关。
+    """
+
+    def __init__(self, keywords, ignore_case=True):
+        self.ignore_case = ignore_case
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [set()]
+        self.terminal = [set()]
+        for keyword in keywords:
+            self._insert(keyword)
+        self._build()
+
+    def _insert(self, keyword):
+        state = 0
+        for char in self._normalize(keyword):
+            if char not in self.goto[state]:
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append(set())
+                self.terminal.append(set())
+                self.goto[state][char] = len(self.goto) - 1
+            state = self.goto[state][char]
+        self.output[state].add(keyword)
+        self.terminal[state].add(keyword)
+
+    def _normalize(self, text):
+        return text.lower() if self.ignore_case else text
+
+    def _build(self):
+        # 按层次遍历计算失配指针，并把失配链上的关键词合并到当前状态
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[next_state] = self.goto[fallback].get(char, 0) if state else 0
+                self.output[next_state] |= self.output[self.fail[next_state]]
+
+    def match(self, text):
+        """返回 text 中出现过的关键词集合"""
+        found = set()
+        state = 0
+        for char in self._normalize(text):
+            while state and char not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(char, 0)
+            if self.output[state]:
+                found |= self.output[state]
+        return found
+
+    def match_prefix(self, text):
+        """返回作为 text 前缀出现的关键词集合"""
+        found = set()
+        state = 0
+        for char in self._normalize(text):
+            state = self.goto[state].get(char)
+            if state is None:
+                break
+            found |= self.terminal[state]
+        return found
@@ -0,0 +1,124 @@
+import re
+import json
+import logging
+
+from keyword_matcher import KeywordMatcher
+
+# 规则类型：
+#   contains   备注中包含 pattern（原 keyword_map 的行为）
+#   prefix     备注以 pattern 开头
+#   exact      备注等于 pattern
+#   regex      备注匹配正则 pattern（re.search）
+#   namespace  命名空间等于 pattern
+RULE_TYPES = ("contains", "prefix", "exact", "regex", "namespace")
+
+
+class RoutingRule:
+    """一条路由规则：命中的行写入 file"""
+
+    def __init__(self, type, pattern, file, priority=0, case_sensitive=False, stop=False):
+        if type not in RULE_TYPES:
+            raise ValueError(f"未知的规则类型: {type}，可选: {', '.join(RULE_TYPES)}")
+        self.type = type
+        self.pattern = pattern
+        self.file = file
+        self.priority = priority
+        self.case_sensitive = case_sensitive
+        # stop=True：命中该规则的行不再参与优先级更低的规则
+        self.stop = stop
+
+    def __repr__(self):
+        return f"RoutingRule({self.type}:{self.pattern} -> {self.file})"
+
+
+class RoutingTable:
+    """
+    把 routing-rules.json 中的全部规则预编译成一个匹配器：
+    contains/prefix 规则合并进 Aho-Corasick 自动机，exact/namespace 规则走哈希表，
+    每个（备注, 命名空间）组合只计算一次，路由耗时不随规则数线性增长（regex 规则除外）。
+    """
+
+    def __init__(self, rules, split_by_namespace=True, remark_column="影响资产备注名称", namespace_column="命名空间"):
+        # 优先级高的在前，同优先级保持配置文件中的顺序
+        self.rules = sorted(rules, key=lambda rule: -rule.priority)
+        self.split_by_namespace = split_by_namespace
+        self.remark_column = remark_column
+        self.namespace_column = namespace_column
+
+        self._patterns = {}     # (类型, 是否区分大小写, pattern) -> [规则序号]
+        self._exact = {}        # (是否区分大小写, 规范化后的备注) -> [规则序号]
+        self._namespaces = {}   # 命名空间 -> [规则序号]
+        self._regexes = []      # [(编译后的正则, 规则序号)]
+        for index, rule in enumerate(self.rules):
+            if rule.type in ("contains", "prefix"):
+                self._patterns.setdefault((rule.type, rule.case_sensitive, rule.pattern), []).append(index)
+            elif rule.type == "exact":
+                key = rule.pattern if rule.case_sensitive else rule.pattern.lower()
+                self._exact.setdefault((rule.case_sensitive, key), []).append(index)
+            elif rule.type == "namespace":
+                self._namespaces.setdefault(rule.pattern, []).append(index)
+            else:
+                flags = 0 if rule.case_sensitive else re.IGNORECASE
+                self._regexes.append((re.compile(rule.pattern, flags), index))
+
+        self._matchers = {
+            case_sensitive: KeywordMatcher(
+                {pattern for (_, sensitive, pattern) in self._patterns if sensitive == case_sensitive},
+                ignore_case=not case_sensitive,
+            )
+            for case_sensitive in (False, True)
+        }
+        self._cache = {}
+
+    @classmethod
+    def load(cls, path):
+        """从 JSON 配置文件加载路由表"""
+        with open(path, "r", encoding="utf-8") as f:
+            config = json.load(f)
+        rules = [RoutingRule(**rule) for rule in config.get("rules", [])]
+        logging.info(f"已加载路由规则 {len(rules)} 条: {path}")
+        return cls(rules, split_by_namespace=config.get("split_by_namespace", True))
+
+    def _match_rules(self, remark, namespace):
+        """返回命中的规则序号（按优先级排序）"""
+        matched = set(self._namespaces.get(namespace, ()))
+        if isinstance(remark, str):
+            for case_sensitive, matcher in self._matchers.items():
+                for pattern in matcher.match(remark):
+                    matched.update(self._patterns.get(("contains", case_sensitive, pattern), ()))
+                for pattern in matcher.match_prefix(remark):
+                    matched.update(self._patterns.get(("prefix", case_sensitive, pattern), ()))
+            matched.update(self._exact.get((True, remark), ()))
+            matched.update(self._exact.get((False, remark.lower()), ()))
+            for regex, index in self._regexes:
+                if regex.search(remark):
+                    matched.add(index)
+        return sorted(matched)
+
+    def files_for(self, remark, namespace):
+        """返回一行数据应写入的文件列表，相同（备注, 命名空间）只计算一次"""
+        key = (remark if isinstance(remark, str) else None, namespace)
+        files = self._cache.get(key)
+        if files is None:
+            files = []
+            for index in self._match_rules(*key):
+                rule = self.rules[index]
+                if rule.file not in files:
+                    files.append(rule.file)
+                if rule.stop:
+                    break
+            files = self._cache[key] = tuple(files)
+        return files
+
+    def route(self, df):
+        """
+        扫描一遍 DataFrame，返回 {文件名: [行位置]}。
+        文件按规则优先级排列，每个文件内的行保持原有顺序。
+        """
+        positions = {rule.file: [] for rule in self.rules}
+        remarks = df[self.remark_column] if self.remark_column in df else [None] * len(df)
+        namespaces = df[self.namespace_column] if self.namespace_column in df else [None] * len(df)
+        for position, (remark, namespace) in enumerate(zip(remarks, namespaces)):
+            for file in self.files_for(remark, namespace):
+                positions[file].append(position)
+        return positions
@@ -0,0 +1,160 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class RunJournal:
+    """
+    漏洞导出流水线的运行日志（检查点），中断后重新运行时从上次完成的阶段继续。
+
+    每个 账号 × 漏洞类型（key 为 {账号}_{漏洞类型}）依次记录：
+      submitted   导出任务 ID
+      linked      下载链接（有效期按 link_ttl 估算，过期后重新查询导出任务取新链接）
+      downloaded  解压出的 .xlsx 路径和 sha256，文件存在且校验一致才复用
+    整次运行记录 merged（合并数据集及其来源文件）、split（拆分出的文件）、mailed（已发送的收件人）。
+
+    所有账号处理成功、邮件全部发送完成后 finish() 标记本次运行结束，下次运行重新开始；有失败时不调用 finish()，
+    再次运行只重新处理失败的部分。超过 max_age 秒仍未完成的运行日志视为过期，不再复用。
+    每次记录后先写临时文件再替换，线程安全。
+    """
+
+    def __init__(self, path, max_age=86400, link_ttl=1800):
+        self.path = path
+        self.max_age = max_age
+        self.link_ttl = link_ttl
+        self.lock = threading.Lock()
+        self.verified = set()
+        self.data = self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            data = None
+        except ValueError as e:
+            logging.warning(f"运行日志 {self.path} 无法解析，重新开始: {e}")
+            data = None
+        now = time.time()
+        if data and not data.get("finished") and now - data.get("started_at", 0) < self.max_age:
+            done = sum(1 for entry in data["exports"].values() if "downloaded" in entry)
+            logging.info(
+                f"从运行日志继续上次未完成的运行（开始于 {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(data['started_at']))}），"
+                f"已下载 {done}/{len(data['exports'])} 个导出文件"
+            )
+            return data
+        return {"started_at": now, "finished": False, "exports": {}, "merged": None, "split": None, "mailed": []}
+
+    def _save(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def _update(self, key, stage, value):
+        with self.lock:
+            self.data["exports"].setdefault(key, {})[stage] = value
+            self._save()
+
+    # ---------------- 每个导出任务的阶段 ----------------
+    def export_id(self, key):
+        return self.data["exports"].get(key, {}).get("submitted", {}).get("export_id")
+
+    def link(self, key):
+        """未过期的下载链接，没有时返回 None"""
+        linked = self.data["exports"].get(key, {}).get("linked")
+        if linked and time.time() - linked["at"] < self.link_ttl:
+            return linked["link"]
+        return None
+
+    def downloaded(self, key):
+        """已下载且校验通过的 .xlsx 路径，没有时返回 None"""
+        downloaded = self.data["exports"].get(key, {}).get("downloaded")
+        if not downloaded or not os.path.exists(downloaded["path"]):
+            return None
+        if key not in self.verified:
+            if file_sha256(downloaded["path"]) != downloaded["sha256"]:
+                logging.warning(f"[{key}] 已下载文件校验不一致，重新下载: {downloaded['path']}")
+                return None
+            self.verified.add(key)
+        return downloaded["path"]
+
+    def record_submitted(self, key, export_id):
+        self._update(key, "submitted", {"export_id": export_id, "at": time.time()})
+
+    def record_linked(self, key, link):
+        self._update(key, "linked", {"link": link, "at": time.time()})
+
+    def discard_link(self, key):
+        """下载失败时丢弃链接，下次从导出任务重新获取"""
+        with self.lock:
+            if self.data["exports"].get(key, {}).pop("linked", None) is not None:
+                self._save()
+
+    def record_downloaded(self, key, path):
+        self._update(key, "downloaded", {"path": path, "sha256": file_sha256(path), "at": time.time()})
+        self.verified.add(key)
+
+    # ---------------- 整次运行的阶段 ----------------
+    def _sources(self, paths):
+        """合并来源：[(文件路径, sha256)]，重新下载过的文件摘要不同，之前的合并结果随之失效"""
+        digests = {
+            entry["downloaded"]["path"]: entry["downloaded"]["sha256"]
+            for entry in self.data["exports"].values() if "downloaded" in entry
+        }
+        return [[path, digests.get(path)] for path in paths]
+
+    def merged(self, sources):
+        """来源文件与上次合并时一致且数据集文件存在时，返回数据集路径"""
+        merged = self.data["merged"]
+        if merged and merged["sources"] == self._sources(sources) and os.path.exists(merged["path"]):
+            return merged["path"]
+        return None
+
+    def record_merged(self, sources, path):
+        with self.lock:
+            self.data["merged"] = {"sources": self._sources(sources), "path": path, "at": time.time()}
+            # 重新合并后之前的拆分结果失效，已发送的附件也不再是最新数据，需要重新发送
+            self.data["split"] = None
+            self.data["mailed"] = []
+            self._save()
+
+    def split_files(self):
+        """上次拆分出的文件都还存在时返回文件列表"""
+        split = self.data["split"]
+        if split is not None and all(os.path.exists(path) for path in split):
+            return split
+        return None
+
+    def record_split(self, paths):
+        with self.lock:
+            self.data["split"] = list(paths)
+            self._save()
+
+    def mailed(self, receiver):
+        return receiver in self.data["mailed"]
+
+    def record_mailed(self, receiver):
+        with self.lock:
+            self.data["mailed"].append(receiver)
+            self._save()
+
+    def finish(self):
+        with self.lock:
+            self.data["finished"] = True
+            self.data["finished_at"] = time.time()
+            self._save()
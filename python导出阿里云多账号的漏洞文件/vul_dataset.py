@@ -0,0 +1,232 @@
+import os
+import logging
+import pandas as pd
+from typing import List
+
+# 合并后数据集的落盘格式：parquet（默认）或 feather，二者都依赖 pyarrow
+DATASET_FORMAT = os.environ.get("VUL_DATASET_FORMAT", "parquet")
+# 流式合并每次读取的行数
+MERGE_CHUNK_ROWS = int(os.environ.get("VUL_MERGE_CHUNK_ROWS", "50000"))
+# 取值重复度高的列，流式合并时保存为分类（字典编码）列
+CATEGORY_COLUMNS = ["命名空间", "来源账号", "漏洞类型"]
+
+
+def _source_columns(path):
+    """从文件名 {账号}_{漏洞类型}_... 解析来源账号、漏洞类型"""
+    parts = os.path.basename(path).split("_")
+    return {"来源账号": parts[0], "漏洞类型": parts[1]}
+
+
+def merge_excels(file_paths: List[str]):
+    """读取各账号导出的 .xlsx，补充来源账号、漏洞类型两列后合并，返回 DataFrame"""
+    dataframes = []
+    for path in file_paths:
+        try:
+            df = pd.read_excel(path)
+            for column, value in _source_columns(path).items():
+                df[column] = value
+            dataframes.append(df)
+        except Exception as e:
+            logging.warning(f"读取 {path} 失败: {e}")
+    if not dataframes:
+        logging.error("无可合并文件")
+        return None
+    merged_df = pd.concat(dataframes, ignore_index=True)
+    logging.info(f"合并完成: {len(file_paths)} 个文件, {len(merged_df)} 行")
+    return merged_df
+
+
+def _header(row):
+    """表头去掉末尾的空单元格，中间的空表头按 pandas 的方式命名为 Unnamed: n"""
+    row = list(row or ())
+    while row and row[-1] is None:
+        row.pop()
+    return [f"Unnamed: {index}" if value is None else str(value) for index, value in enumerate(row)]
+
+
+def _read_header(path):
+    from openpyxl import load_workbook
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        return _header(next(workbook.active.iter_rows(max_row=1, values_only=True), None))
+    finally:
+        workbook.close()
+
+
+def iter_excel_chunks(path: str, chunk_rows: int = MERGE_CHUNK_ROWS):
+    """以只读模式逐行读取 .xlsx，每 chunk_rows 行产出一个 DataFrame（第一行为表头，跳过空行）"""
+    from openpyxl import load_workbook
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = _header(next(rows, None))
+        if not header:
+            return
+        width = len(header)
+        chunk = []
+        for row in rows:
+            row = tuple(row[:width]) + (None,) * (width - len(row))
+            if all(value is None for value in row):
+                continue
+            chunk.append(row)
+            if len(chunk) >= chunk_rows:
+                yield pd.DataFrame(chunk, columns=header)
+                chunk = []
+        if chunk:
+            yield pd.DataFrame(chunk, columns=header)
+    finally:
+        workbook.close()
+
+
+def stringify_mixed_columns(df):
+    """Excel 中同一列可能混有数字和文本，只把这样的 object 列转为字符串，数字、日期等列保持原类型"""
+    mixed = [
+        column for column in df.select_dtypes(include="object").columns
+        if df[column].dropna().map(type).nunique() > 1
+    ]
+    return df.astype({column: "string" for column in mixed})
+
+
+def _common_type(types):
+    """
+    同一列在各分块中推断出的类型不一致时取公共类型：
+    整数和浮点数取浮点数，时间统一为微秒精度，其他组合（如数字和文本）取字符串
+    """
+    import pyarrow as pa
+    types = {pa.string() if pa.types.is_large_string(t) else t for t in types}
+    if len(types) == 1:
+        return types.pop()
+    if types and all(pa.types.is_integer(t) or pa.types.is_floating(t) for t in types):
+        return pa.float64()
+    if types and all(pa.types.is_timestamp(t) for t in types) and len({t.tz for t in types}) == 1:
+        return pa.timestamp("us", next(iter(types)).tz)
+    return pa.string()
+
+
+def _conform(table, schema):
+    """把暂存的分块转换为最终的 schema，整列为空时直接生成对应类型的空列"""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    arrays = []
+    for field in schema:
+        column = table.column(field.name)
+        if column.null_count == len(column):
+            arrays.append(pa.nulls(len(column), field.type))
+        elif pa.types.is_dictionary(field.type):
+            arrays.append(pc.dictionary_encode(column.cast(pa.string())))
+        else:
+            arrays.append(column.cast(field.type))
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+def merge_excels_chunked(file_paths: List[str], path_prefix: str, chunk_rows: int = MERGE_CHUNK_ROWS):
+    """
+    流式合并：逐个文件按 chunk_rows 行分块读取，补充来源账号、漏洞类型两列后写入 {path_prefix}.parquet，
+    内存中同时只有一个分块，峰值内存与账号数、总行数无关。返回数据集路径，没有可合并的数据时返回 None。
+
+    各文件的列取并集（先只读取各文件的表头）。每个文件的分块先暂存到临时目录，整个文件读完才计入合并结果，
+    中途读取失败的文件整体跳过，不会留下一部分行。全部读完后按各列在所有分块中的类型确定最终类型
+    （见 _common_type，只有混有数字和文本的列才按字符串存储），再把暂存的分块依次转换后写入数据集。
+    CATEGORY_COLUMNS 中的列保存为分类列，load_dataset 读回时为 category 类型。
+    流式合并只支持 parquet（feather 文件不能在各分块中使用不同的字典）。
+    """
+    import shutil
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    headers = {}
+    for path in file_paths:
+        try:
+            headers[path] = _read_header(path)
+        except Exception as e:
+            logging.warning(f"读取 {path} 失败: {e}")
+    columns = []
+    for header in headers.values():
+        columns.extend(column for column in header if column not in columns)
+    columns.extend(column for column in ("来源账号", "漏洞类型") if column not in columns)
+
+    path = f"{path_prefix}.parquet"
+    staging_dir = path + ".staging"
+    shutil.rmtree(staging_dir, ignore_errors=True)
+    os.makedirs(staging_dir)
+    # 已读完的文件暂存的分块 [(文件路径, 行数)]，以及各列在非空分块中的类型
+    staged = []
+    column_types = {column: set() for column in columns}
+    try:
+        for index, source in enumerate(headers):
+            source_chunks = []
+            source_types = {column: set() for column in columns}
+            try:
+                for chunk in iter_excel_chunks(source, chunk_rows):
+                    for column, value in _source_columns(source).items():
+                        chunk[column] = value
+                    chunk = stringify_mixed_columns(chunk.reindex(columns=columns))
+                    table = pa.Table.from_pandas(chunk, preserve_index=False)
+                    for column in columns:
+                        if table.column(column).null_count < len(table):
+                            source_types[column].add(table.schema.field(column).type)
+                    chunk_path = os.path.join(staging_dir, f"{index:05d}-{len(source_chunks):06d}.parquet")
+                    pq.write_table(table, chunk_path)
+                    source_chunks.append((chunk_path, len(table)))
+            except Exception as e:
+                logging.warning(f"读取 {source} 失败，跳过整个文件: {e}")
+                for chunk_path, _ in source_chunks:
+                    os.remove(chunk_path)
+                continue
+            staged.extend(source_chunks)
+            for column, types in source_types.items():
+                column_types[column].update(types)
+
+        if not staged:
+            logging.error("无可合并文件")
+            return None
+
+        schema = pa.schema([
+            pa.field(column, pa.dictionary(pa.int32(), pa.string()) if column in CATEGORY_COLUMNS else _common_type(column_types[column]))
+            for column in columns
+        ])
+        tmp_path = path + ".tmp"
+        with pq.ParquetWriter(tmp_path, schema) as writer:
+            for chunk_path, _ in staged:
+                writer.write_table(_conform(pq.read_table(chunk_path), schema))
+        os.replace(tmp_path, path)
+    finally:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+    total_rows = sum(rows for _, rows in staged)
+    logging.info(f"流式合并完成: {len(file_paths)} 个文件, {total_rows} 行, 保存为: {path}")
+    return path
+
+
+def save_dataset(df, path_prefix: str, fmt: str = DATASET_FORMAT):
+    """把合并后的数据集保存为列式文件，返回文件路径"""
+    df = stringify_mixed_columns(df)
+    path = f"{path_prefix}.{fmt}"
+    if fmt == "feather":
+        df.to_feather(path)
+    else:
+        df.to_parquet(path, index=False)
+    logging.info(f"合并后的数据集保存为: {path}")
+    return path
+
+
+def load_dataset(path: str):
+    """读取 save_dataset 保存的数据集"""
+    if path.endswith(".feather"):
+        return pd.read_feather(path)
+    return pd.read_parquet(path)
+
+
+def iter_dataset(path: str, batch_rows: int = MERGE_CHUNK_ROWS):
+    """
+    按批读取 save_dataset / merge_excels_chunked 保存的数据集，每批产出一个 DataFrame。
+    parquet 按行组逐批读取（iter_batches），内存中同时只有一批；feather 不支持按批读取，整体读入后切片。
+    """
+    if path.endswith(".feather"):
+        df = pd.read_feather(path)
+        for start in range(0, len(df), batch_rows):
+            yield df.iloc[start:start + batch_rows]
+        return
+    import pyarrow.parquet as pq
+    with pq.ParquetFile(path) as parquet_file:
+        for batch in parquet_file.iter_batches(batch_size=batch_rows):
+            yield batch.to_pandas()
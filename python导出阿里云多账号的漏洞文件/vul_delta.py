@@ -0,0 +1,189 @@
+import os
+import json
+import logging
+import numpy as np
+import pandas as pd
+
+# 识别同一条漏洞记录的列：账号、漏洞类型、漏洞标识，加上资产列，只使用数据中实际存在的列
+DELTA_KEY_COLUMNS = os.environ.get(
+    "VUL_DELTA_KEYS", "来源账号,漏洞类型,命名空间,漏洞名称"
+).split(",")
+# 标识资产的列，按顺序取数据中第一个存在的列：优先实例 ID，其次 IP；
+# 备注名称是可随时修改的自由文本，只在没有实例 ID 和 IP 列时兜底使用
+DELTA_ASSET_COLUMNS = os.environ.get(
+    "VUL_DELTA_ASSET_KEYS", "实例ID,私网IP,公网IP,影响资产备注名称"
+).split(",")
+
+
+class BucketDigest:
+    """
+    拆分文件的内容摘要：由每行完整内容的 64 位哈希累加得到（行数、哈希之和 mod 2^64、哈希异或），
+    与行顺序无关，可以分批 update
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.total = np.uint64(0)
+        self.xor = np.uint64(0)
+
+    def update(self, hashes):
+        hashes = np.asarray(hashes, dtype="uint64")
+        self.count += len(hashes)
+        with np.errstate(over="ignore"):
+            self.total = np.uint64(self.total + hashes.sum(dtype="uint64"))
+        self.xor = np.uint64(self.xor ^ np.bitwise_xor.reduce(hashes, initial=np.uint64(0)))
+        return self
+
+    def hexdigest(self):
+        return f"{self.count}-{int(self.total):016x}-{int(self.xor):016x}"
+
+
+class DeltaStore:
+    """
+    增量模式的指纹库：保存上次运行时每条漏洞记录的指纹（按 DELTA_KEY_COLUMNS 和资产列计算的 64 位哈希）
+    以及每个拆分文件的摘要，用于计算新增/已修复/未变化的记录和内容有变化的拆分文件。
+    拆分文件的摘要按整行内容计算，风险等级、状态等非关键列变化也会被发现；
+    有变化的文件只有写出并发送成功（commit）后才保存新摘要，失败的文件下次运行仍视为有变化。
+
+    state_dir 下的文件：
+      fingerprints.parquet  指纹、来源账号、漏洞类型
+      buckets.json          {拆分文件名: 摘要}
+    """
+
+    def __init__(self, state_dir, key_columns=None, asset_columns=None):
+        self.state_dir = state_dir
+        self.key_columns = key_columns or DELTA_KEY_COLUMNS
+        self.asset_columns = asset_columns or DELTA_ASSET_COLUMNS
+        self._warned = False
+        self.fingerprints_path = os.path.join(state_dir, "fingerprints.parquet")
+        self.buckets_path = os.path.join(state_dir, "buckets.json")
+        self.previous = self._load_fingerprints()
+        self.previous_buckets = self._load_buckets()
+        self.current = None
+        self.current_buckets = {}
+        self.pending_buckets = {}
+
+    def _load_fingerprints(self):
+        if not os.path.exists(self.fingerprints_path):
+            logging.info("增量模式: 没有历史指纹，本次按全量处理")
+            return pd.DataFrame({"fingerprint": pd.Series(dtype="uint64")})
+        return pd.read_parquet(self.fingerprints_path)
+
+    def _load_buckets(self):
+        try:
+            with open(self.buckets_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def fingerprint(self, df):
+        """按关键列和资产列计算每行的指纹，返回与 df 行对齐的 uint64 Series"""
+        columns = [column for column in self.key_columns if column in df.columns]
+        assets = [column for column in self.asset_columns if column in df.columns]
+        if not self._warned:
+            # 流式模式下按批调用，只提示一次
+            self._warned = True
+            if len(columns) < len(self.key_columns):
+                logging.warning(f"增量模式: 数据中缺少关键列 {set(self.key_columns) - set(columns)}，使用: {columns}")
+            if not assets:
+                logging.warning(f"增量模式: 数据中没有资产列 {self.asset_columns}，不同资产上的同一漏洞会视为同一条记录")
+            elif assets[0] != self.asset_columns[0]:
+                logging.warning(f"增量模式: 数据中没有 {self.asset_columns[0]} 列，按 {assets[0]} 识别资产")
+        columns += assets[:1]
+        if not columns:
+            columns = list(df.columns)
+        keys = df[columns].astype("string").fillna("")
+        return pd.util.hash_pandas_object(keys, index=False)
+
+    def row_hashes(self, df):
+        """每行完整内容（所有列）的 64 位哈希"""
+        return pd.util.hash_pandas_object(df.astype("string").fillna(""), index=False).to_numpy()
+
+    def diff(self, df):
+        """计算新增、已修复、未变化的记录数，并记录本次的指纹"""
+        return self.diff_batches([df])
+
+    def diff_batches(self, batches):
+        """
+        同 diff，数据按批给出（如 vul_dataset.iter_dataset 逐批读取的数据集），
+        内存中只保留每行的指纹和来源账号、漏洞类型
+        """
+        parts = []
+        for df in batches:
+            part = pd.DataFrame({"fingerprint": self.fingerprint(df).to_numpy()})
+            for column in ("来源账号", "漏洞类型"):
+                if column in df.columns:
+                    part[column] = df[column].to_numpy()
+            parts.append(part)
+        self.current = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame({"fingerprint": pd.Series(dtype="uint64")})
+        for column in ("来源账号", "漏洞类型"):
+            if column in self.current.columns:
+                self.current[column] = self.current[column].astype("category")
+
+        previous = self.previous["fingerprint"].to_numpy()
+        current = self.current["fingerprint"].to_numpy()
+        is_new = ~np.isin(current, previous)
+        resolved = ~np.isin(previous, current)
+        summary = {
+            "new": int(is_new.sum()),
+            "resolved": int(resolved.sum()),
+            "unchanged": int(len(current) - is_new.sum()),
+        }
+        logging.info(
+            f"增量模式: 新增 {summary['new']} 条, 已修复 {summary['resolved']} 条, 未变化 {summary['unchanged']} 条"
+        )
+        if "来源账号" in self.current and summary["new"]:
+            per_account = self.current.loc[is_new, "来源账号"].value_counts()
+            for account, count in per_account[per_account > 0].items():
+                logging.info(f"[{account}] 新增漏洞 {count} 条")
+        return summary
+
+    def bucket_changed(self, filename, digest):
+        """登记拆分文件的摘要，返回内容是否与上次运行不同；有变化的摘要需 commit 后才会保存"""
+        if self.previous_buckets.get(filename) == digest:
+            self.current_buckets[filename] = digest
+            return False
+        self.pending_buckets[filename] = digest
+        return True
+
+    def changed_buckets(self, outputs):
+        """
+        outputs 为 {文件路径: DataFrame}，返回其中内容与上次运行不同的部分。
+        摘要由文件内所有行的完整内容计算，与行顺序无关。
+        """
+        digests = {path: BucketDigest().update(self.row_hashes(df)) for path, df in outputs.items()}
+        changed = self.changed_files(digests)
+        return {path: df for path, df in outputs.items() if path in changed}
+
+    def changed_files(self, digests):
+        """digests 为 {文件路径: BucketDigest}（流式拆分时边写边累加），返回内容与上次运行不同的文件路径列表"""
+        changed = [path for path, digest in digests.items() if self.bucket_changed(os.path.basename(path), digest.hexdigest())]
+        logging.info(f"增量模式: {len(digests)} 个拆分文件中有 {len(changed)} 个发生变化")
+        return changed
+
+    def commit(self, filenames):
+        """记录已写出并发送成功的拆分文件的新摘要"""
+        for filename in filenames:
+            if filename in self.pending_buckets:
+                self.current_buckets[filename] = self.pending_buckets.pop(filename)
+        if self.pending_buckets:
+            logging.warning(f"增量模式: {len(self.pending_buckets)} 个有变化的拆分文件未写出或未发送成功，下次运行重新发送")
+
+    def save(self):
+        """保存本次的指纹和拆分文件摘要，先写临时文件再替换，避免中途失败损坏状态"""
+        if self.current is None:
+            return
+        os.makedirs(self.state_dir, exist_ok=True)
+        tmp_path = self.fingerprints_path + ".tmp"
+        self.current.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, self.fingerprints_path)
+        tmp_path = self.buckets_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            # 未提交的文件保留上次的摘要（没有时不记录），下次运行仍视为有变化
+            buckets = dict(self.current_buckets)
+            for filename in self.pending_buckets:
+                if filename in self.previous_buckets:
+                    buckets[filename] = self.previous_buckets[filename]
+            json.dump(buckets, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.buckets_path)
+        logging.info(f"增量模式: 指纹已保存到 {self.state_dir}")
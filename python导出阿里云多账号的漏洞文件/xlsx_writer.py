@@ -0,0 +1,130 @@
+import os
+import time
+import logging
+import multiprocessing
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# 写 xlsx 的引擎：
+#   openpyxl             pandas 默认的 to_excel，保留表头样式
+#   openpyxl_write_only  openpyxl 只写模式，逐行追加，内存占用低
+#   xlsxwriter           xlsxwriter constant_memory 模式，逐行写出，速度最快
+# 分批追加写出（XlsxAppender，流式拆分使用）只支持后两种，openpyxl 按 openpyxl_write_only 处理
+XLSX_ENGINE = os.environ.get("VUL_XLSX_ENGINE", "openpyxl")
+# 并行写文件的进程数，设为 1 时在当前进程内逐个写
+XLSX_WORKERS = int(os.environ.get("VUL_XLSX_WORKERS", str(os.cpu_count() or 1)))
+
+
+def _cell(value):
+    """把 pandas 的空值、时间戳转换成写入引擎能识别的值"""
+    if value is None or value is pd.NaT:
+        return None
+    if isinstance(value, pd.Timestamp):
+        return value.to_pydatetime()
+    try:
+        if pd.isna(value):
+            return None
+    except (TypeError, ValueError):
+        pass
+    return value
+
+
+class XlsxAppender:
+    """
+    分批追加行写出 xlsx，内存占用与总行数无关：engine 为 xlsxwriter 时使用 constant_memory 模式，
+    其他取值都使用 openpyxl 只写模式（行先写入临时文件，close 时生成 xlsx）。
+    """
+
+    def __init__(self, path: str, columns, engine: str = XLSX_ENGINE):
+        self.path = path
+        self.engine = "xlsxwriter" if engine == "xlsxwriter" else "openpyxl_write_only"
+        self.rows = 0
+        self.started = time.monotonic()
+        header = [str(column) for column in columns]
+        if self.engine == "xlsxwriter":
+            import xlsxwriter
+            self.workbook = xlsxwriter.Workbook(path, {
+                "constant_memory": True,
+                "default_date_format": "yyyy-mm-dd hh:mm:ss",
+            })
+            self.sheet = self.workbook.add_worksheet("Sheet1")
+            self.sheet.write_row(0, 0, header)
+        else:
+            from openpyxl import Workbook
+            self.workbook = Workbook(write_only=True)
+            self.sheet = self.workbook.create_sheet("Sheet1")
+            self.sheet.append(header)
+
+    def append(self, df: pd.DataFrame):
+        """按 DataFrame 的行顺序追加写入"""
+        for row in df.itertuples(index=False, name=None):
+            values = [_cell(value) for value in row]
+            self.rows += 1
+            if self.engine == "xlsxwriter":
+                self.sheet.write_row(self.rows, 0, values)
+            else:
+                self.sheet.append(values)
+
+    def close(self):
+        """生成 xlsx 文件，返回 (文件路径, 行数, 耗时秒)"""
+        if self.engine == "xlsxwriter":
+            self.workbook.close()
+        else:
+            self.workbook.save(self.path)
+        return self.path, self.rows, time.monotonic() - self.started
+
+
+def write_xlsx(df: pd.DataFrame, path: str, engine: str = XLSX_ENGINE):
+    """把 DataFrame 写成 xlsx，返回 (文件路径, 行数, 耗时秒)"""
+    if engine in ("xlsxwriter", "openpyxl_write_only"):
+        writer = XlsxAppender(path, df.columns, engine)
+        writer.append(df)
+        return writer.close()
+    started = time.monotonic()
+    df.to_excel(path, index=False)
+    return path, len(df), time.monotonic() - started
+
+
+def write_xlsx_batches(batches, path: str, engine: str = XLSX_ENGINE):
+    """
+    把按批产出的 DataFrame 依次追加写成一个 xlsx（XlsxAppender），内存中同时只有一批，
+    记录行数和耗时后返回文件路径；没有任何批次时不生成文件，返回 None
+    """
+    writer = None
+    for batch in batches:
+        if writer is None:
+            writer = XlsxAppender(path, batch.columns, engine)
+        writer.append(batch)
+    if writer is None:
+        return None
+    return _log_written(*writer.close())
+
+
+def write_xlsx_files(outputs, workers: int = XLSX_WORKERS, engine: str = XLSX_ENGINE):
+    """
+    并行写出多个 xlsx 文件，outputs 为 {文件路径: DataFrame}。
+    每个文件写完后记录行数和耗时，返回写成功的文件路径列表。
+    调用时进程中通常已有其他线程（轮询线程、线程池），fork 出的子进程会继承其中被持有的锁，因此用 spawn 启动子进程。
+    """
+    written = []
+    if workers <= 1 or len(outputs) <= 1:
+        for path, df in outputs.items():
+            try:
+                written.append(_log_written(*write_xlsx(df, path, engine)))
+            except Exception as e:
+                logging.error(f"写入 {path} 失败: {e}")
+        return written
+
+    with ProcessPoolExecutor(max_workers=min(workers, len(outputs)), mp_context=multiprocessing.get_context("spawn")) as executor:
+        futures = {executor.submit(write_xlsx, df, path, engine): path for path, df in outputs.items()}
+        for future in as_completed(futures):
+            try:
+                written.append(_log_written(*future.result()))
+            except Exception as e:
+                logging.error(f"写入 {futures[future]} 失败: {e}")
+    return written
+
+
+def _log_written(path, rows, seconds):
+    logging.info(f"已保存: {path}（{rows} 行，耗时 {seconds:.2f}s）")
+    return path
@@ -1,23 +1,24 @@
 import os
 import sys
 import json
-import time
 import smtplib
-import zipfile
 import logging
-import requests
 import pandas as pd
-from io import BytesIO
 from typing import List
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from email.mime.application import MIMEApplication
 
-from alibabacloud_sas20181203.client import Client as Sas20181203Client
-from alibabacloud_tea_openapi import models as open_api_models
 from alibabacloud_sas20181203 import models as sas_20181203_models
 from alibabacloud_tea_util import models as util_models
 
+# 仓库根目录下的共用模块 aliyun_common（镜像中与脚本放在同一目录）
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from aliyun_common import client_factory, credential_from_config
+
+from export_poller import ExportPoller
+from download_client import DownloadClient
+
 # 邮件配置
 smtp_server = "smtpdm.aliyun.com"  # 固定地址，勿改
 smtp_port = 80                   # 非加密端口
@@ -37,22 +38,27 @@ logging.basicConfig(
     ]
 )
 
+# 集中轮询调度器：自适应退避 + 总超时（秒）
+poller = ExportPoller(deadline=int(os.environ.get("VUL_EXPORT_DEADLINE", "3600")))
+
+# 共享下载客户端：连接池复用 + 连接/读取超时 + 5xx 与连接错误指数退避重试
+http_client = DownloadClient(
+    connect_timeout=int(os.environ.get("VUL_DOWNLOAD_CONNECT_TIMEOUT", "10")),
+    read_timeout=int(os.environ.get("VUL_DOWNLOAD_READ_TIMEOUT", "120")),
+)
+
 
 class VulExporter:
-    def __init__(self, ak, sk, name):
-        self.ak = ak
-        self.sk = sk
-        self.name = name
+    def __init__(self, account):
+        self.account = account
+        self.name = account["name"]
         self.client = self.create_client()
         self.runtime = util_models.RuntimeOptions()
 
     def create_client(self):
-        config = open_api_models.Config(
-            access_key_id=self.ak,
-            access_key_secret=self.sk
-        )
-        config.endpoint = 'tds.aliyuncs.com'
-        return Sas20181203Client(config)
+        # 同一账号只创建一次客户端，支持 AK/SK 和 RAM 角色（role_arn）两种配置
+        client_factory.add_account(self.name, credential_from_config(self.account))
+        return client_factory.client(self.name, "sas", "tds.aliyuncs.com")
 
     def export_vulnerability(self):
         request = sas_20181203_models.ExportVulRequest(
@@ -65,32 +71,16 @@ class VulExporter:
         return result.body.id
 
     def wait_for_export(self, export_id):
-        for _ in range(60):
-            try:
-                request = sas_20181203_models.DescribeVulExportInfoRequest(export_id=export_id)
-                result = self.client.describe_vul_export_info_with_options(request, self.runtime)
-                if result.body.export_status == "success":
-                    logging.info(f"[{self.name}] 导出成功: {result.body.link}")
-                    return result.body.link
-            except Exception as e:
-                logging.warning(f"[{self.name}] 查询导出状态失败: {e}")
-            time.sleep(15)
-        raise TimeoutError(f"[{self.name}] 导出超时")
+        return poller.wait(self.client, export_id, self.name)
 
     def download_xlsx(self, url):
         try:
-            response = requests.get(url)
-            if response.status_code == 200:
-                with zipfile.ZipFile(BytesIO(response.content), 'r') as zip_ref:
-                    for file_info in zip_ref.infolist():
-                        if file_info.filename.endswith(".xlsx"):
-                            filepath = os.path.join("./app/log", f"{self.name}_{file_info.filename}")
-                            zip_ref.extract(file_info, "./app/log")
-                            os.rename(os.path.join("./app/log", file_info.filename), filepath)
-                            return filepath
+            xlsx_path = http_client.download_and_extract(url, self.name, "./app/log")
+            if xlsx_path:
+                return xlsx_path
             logging.error(f"[{self.name}] 下载失败")
         except Exception as e:
-            logging.error(f"[{self.name}] 解压失败: {e}")
+            logging.error(f"[{self.name}] 下载或解压失败: {e}")
         return None
 
 def merge_excels(file_paths: List[str], output_file: str):
@@ -145,12 +135,10 @@ def main():
 
     for account in configs:
         name = account["name"]
-        ak = account["ak"]
-        sk = account["sk"]
         logging.info(f"开始处理账号: {name}")
 
         try:
-            exporter = VulExporter(ak, sk, name)
+            exporter = VulExporter(account)
             export_id = exporter.export_vulnerability()
             download_url = exporter.wait_for_export(export_id)
             xlsx_path = exporter.download_xlsx(download_url)
@@ -158,6 +146,9 @@ def main():
                 xlsx_files.append(xlsx_path)
         except Exception as e:
             logging.error(f"[{name}] 处理失败: {e}")
+    poller.log_metrics()
+    http_client.log_stats()
+    client_factory.log_stats()
 
     merged_file = merge_excels(xlsx_files, "./app/log/app_all.xlsx")
 
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+"""
+统一调度入口：在一个进程、一个 asyncio 事件循环中运行漏洞导出、DNS 解析记录导出、WAF 域名导出和 OSS 巡检。
+
+各工具目录中的脚本照常可以单独运行；这里按文件路径导入它们，复用其中的配置（环境变量）和处理函数，
+阻塞的 SDK 调用统一交给 Orchestrator 的线程池，调度、并发、超时和取消由 Orchestrator 负责。
+"""
+import os
+import sys
+import json
+import asyncio
+import logging
+import importlib.util
+
+from aliyun_common import Orchestrator, client_factory, configure_http_pool
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# 各工具所在目录和入口脚本
+TOOLS = {
+    'vul': ('python导出阿里云多账号的漏洞文件', 'all-account-app-emg-chaifen-more-excel.py'),
+    'dns': ('python导出阿里云dns解析记录', 'export-dns.py'),
+    'waf': ('导出阿里云waf的cname记录', 'export-waf-cname.py'),
+    'oss': ('检测oss文件变化报警', 'monitor-oss-object.py'),
+}
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# 要运行的任务，逗号分隔
+enabled_jobs = [name.strip() for name in os.environ.get('ORCH_JOBS', 'vul,dns,waf,oss').split(',') if name.strip()]
+# 阻塞调用（SDK 请求、下载、写文件）的线程数，所有任务共用
+blocking_workers = int(os.environ.get('ORCH_BLOCKING_WORKERS', '32'))
+# 单个任务的超时和整体超时（秒），0 表示不限制
+job_deadline = int(os.environ.get('ORCH_JOB_DEADLINE', '0')) or None
+total_deadline = int(os.environ.get('ORCH_DEADLINE', '7200')) or None
+
+
+def load_tool(name):
+    """按文件路径导入工具脚本（脚本名不是合法的模块名），工具目录加入 sys.path 以便导入同目录的模块"""
+    directory, script = TOOLS[name]
+    directory = os.path.join(ROOT, directory)
+    if directory not in sys.path:
+        sys.path.insert(0, directory)
+    spec = importlib.util.spec_from_file_location(f'{name}_tool', os.path.join(directory, script))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    module.tool_dir = directory
+    return module
+
+
+def tool_path(module, path):
+    """工具配置中的相对路径按工具目录解析（单独运行时工具都在自己的目录下启动）"""
+    return path if os.path.isabs(path) else os.path.join(module.tool_dir, path)
+
+
+async def run_vul(orch, vul):
+    with open(tool_path(vul, 'config.json'), 'r') as f:
+        configs = json.load(f)
+    vul.routing_rules_file = tool_path(vul, vul.routing_rules_file)
+    vul.delta_state_dir = tool_path(vul, vul.delta_state_dir)
+    # 阻塞调用都在 Orchestrator 的线程池中执行，拆分文件在当前线程内逐个写出，不再另开进程池
+    vul.xlsx_workers = 1
+    logging.info(f"[vul] 处理 {len(configs)} 个账号")
+    xlsx_files, failed_accounts = await vul.run_async_exports(configs, ['app', 'emg'], orch.blocking)
+    vul.poller.log_metrics()
+    vul.http_client.log_stats()
+    await orch.blocking(vul.publish_results, xlsx_files, failed_accounts, tool_path(vul, 'email_config.json'))
+    return len(xlsx_files)
+
+
+async def run_dns(orch, dns):
+    dns.call_layer.set_limit('alidns', dns.api_qps)
+    # 各页请求提交到 Orchestrator 的线程池，不再另开线程池
+    exporter = dns.DnsRecordExporter(
+        dns.Sample.create_client(), dns.util_models.RuntimeOptions(), workers=dns.export_workers, status='ENABLE',
+        executor=orch.executor
+    )
+    if dns.dns_domains == ['*']:
+        domains = await orch.blocking(exporter.discover_domains)
+        logging.info(f"[dns] 发现 {len(domains)} 个域名")
+    else:
+        domains = dns.dns_domains
+    # 记录边取边写入文件，不在内存中攒全部记录；各页请求在 Orchestrator 的线程池中并发执行
+    desired = await orch.blocking(dns.Sample.write_records, exporter.iter_records(domains), tool_path(dns, dns.output_file))
+    count = sum(exporter.counts.values())
+    logging.info(f"[dns] 共导出 {len(exporter.counts)} 个域名的 {count} 条解析记录, 失败域名 {len(exporter.failed)} 个")
+    await orch.blocking(
+        dns.Sample.sync_ssl_targets, desired, set(domains) - set(exporter.failed), tool_path(dns, 'ssl-cert-job.yaml')
+    )
+    return count
+
+
+async def run_waf(orch, waf):
+    exporter = waf.WafDomainExporter(waf.Sample.create_client)
+    pages = await asyncio.gather(
+        *(exporter.fetch_instance_async(region_id, instance_id, orch.blocking) for region_id, instance_id in waf.waf_instances)
+    )
+    records = [record for page in pages for record in page]
+    logging.info(f"[waf] 共获取到 {len(records)} 个域名, 失败 {len(exporter.failed)} 页")
+    await orch.blocking(
+        waf.Sample.write_records, records, tool_path(waf, 'domain.txt'), tool_path(waf, waf.output_file)
+    )
+    return len(records)
+
+
+async def run_oss(orch, monitor):
+    monitor.state_dir = tool_path(monitor, monitor.state_dir)
+    try:
+        if not monitor.buckets_config:
+            return await orch.blocking(monitor.scan_default_bucket)
+        monitor.buckets_config = tool_path(monitor, monitor.buckets_config)
+        jobs = monitor.load_bucket_jobs()
+        os.makedirs(monitor.state_dir, exist_ok=True)
+        results = await asyncio.gather(*(orch.blocking(monitor.scan_bucket_job, job) for job in jobs), return_exceptions=True)
+        for job, result in zip(jobs, results):
+            if isinstance(result, BaseException):
+                logging.error(f"[oss/{job.name}] 扫描失败: {result}")
+            else:
+                logging.info(f"[oss/{job.name}] 对象 {result[0]} 个, 变化 {result[1]} 个")
+        for job in jobs:
+            await orch.blocking(job.digest.close, False)
+        return sum(result[1] for result in results if not isinstance(result, BaseException))
+    finally:
+        # 发送尚未到窗口结束的告警摘要
+        await orch.blocking(monitor.alert_digest.close)
+
+
+RUNNERS = {'vul': run_vul, 'dns': run_dns, 'waf': run_waf, 'oss': run_oss}
+
+
+def main():
+    # 所有任务共用 OpenAPI SDK 的 HTTPS 连接池，连接数不小于阻塞调用的线程数
+    configure_http_pool(size=blocking_workers)
+    orch = Orchestrator(max_blocking=blocking_workers, deadline=total_deadline)
+    for name in enabled_jobs:
+        try:
+            orch.add(name, RUNNERS[name], load_tool(name), deadline=job_deadline)
+        except Exception as error:
+            logging.error(f"[{name}] 加载失败: {error}")
+    results = orch.run()
+    client_factory.log_stats()
+    if any(isinstance(result, BaseException) for result in results.values()):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
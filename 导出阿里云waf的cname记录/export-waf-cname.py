@@ -1,13 +1,31 @@
 import os
 import sys
+import logging
 from typing import List # Python标准库中的类型提示模块，用于提供类型注解。List 是一个泛型类型，表示列表。
-import json
 
 from alibabacloud_waf_openapi20211001.client import Client as waf_openapi20211001Client  # 阿里云WAF的客户端类，用于调用WAF相关的API。
-from alibabacloud_tea_openapi import models as open_api_models # 阿里云OpenAPI模型模块，包含各种请求和响应的数据结构
-from alibabacloud_waf_openapi20211001 import models as waf_openapi_20211001_models # WAF服务的具体数据模型模块，包含WAF API请求和响应的数据结构。
-from alibabacloud_tea_util import models as util_models # 阿里云工具包中的通用模型模块，包含一些实用的数据结构
-from alibabacloud_tea_util.client import Client as UtilClient # 阿里云工具包中的实用工具客户端，提供了一些辅助功能。
+
+# 仓库根目录下的共用模块 aliyun_common
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from aliyun_common import client_factory, credential_from_env, configure_http_pool
+
+from waf_export import WafDomainExporter, RecordWriter, parse_instances
+
+
+# API 调用统计等日志输出到控制台
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# 要导出的 WAF 实例，格式 "地域:实例ID"，多个用逗号分隔
+waf_instances = parse_instances(os.environ.get('WAF_INSTANCES', 'cn-hangzhou:********'))  # 替换为你的实例ID
+# 并发请求数
+export_workers = int(os.environ.get('WAF_EXPORT_WORKERS', '4'))
+# 域名和 CNAME 的输出文件及格式（csv 或 jsonl）
+output_format = os.environ.get('WAF_OUTPUT_FORMAT', 'csv')
+output_file = os.environ.get('WAF_OUTPUT_FILE', f'waf_domains.{output_format}')
+
+# 凭证来自环境变量 ALIBABA_CLOUD_ACCESS_KEY_ID / ALIBABA_CLOUD_ACCESS_KEY_SECRET，
+# 另外设置 ALIBABA_CLOUD_ROLE_ARN 时通过 STS 扮演该角色，临时凭证到期前自动刷新
+client_factory.add_account('default', credential_from_env())
 
 
 class Sample:
@@ -15,71 +33,37 @@ class Sample:
         pass
 
     @staticmethod
-    def create_client() -> waf_openapi20211001Client:
-        config = open_api_models.Config(
-            access_key_id=os.environ['ALIBABA_CLOUD_ACCESS_KEY_ID'],
-            access_key_secret=os.environ['ALIBABA_CLOUD_ACCESS_KEY_SECRET']
-        )
-        config.endpoint = f'wafopenapi.cn-hangzhou.aliyuncs.com'
-        return waf_openapi20211001Client(config)
-    
+    def create_client(region_id='cn-hangzhou') -> waf_openapi20211001Client:
+        # 客户端由共用的客户端工厂按地域缓存
+        return client_factory.client('default', 'waf', f'wafopenapi.{region_id}.aliyuncs.com')
 
+    @staticmethod
+    def write_records(records, domain_path='domain.txt', path=None) -> None:
+        """边获取边写入：domain_path 每行一个域名，path 为域名和 CNAME 的结构化记录"""
+        with open(file=domain_path, mode="wt", encoding="utf-8") as f, \
+                open(file=path or output_file, mode="wt", encoding="utf-8", newline='') as out:
+            writer = RecordWriter(out, output_format)
+            for record in records:
+                f.write(record['domain'] + '\n')
+                writer.write(record)
+        logging.info(f"域名和 CNAME 已写入 {path or output_file}")
 
     @staticmethod
     def main(args: List[str]) -> None:
         try:
-            client = Sample.create_client()
-            page = 1  # 从第1页开始
-            all_domains = []  # 存储所有域名
-
-            with open(file="domain.txt", mode="wt", encoding="utf-8") as f:
-
-                while True:
-                    # 创建请求
-                    describe_domains_request = waf_openapi_20211001_models.DescribeDomainsRequest(
-                        region_id='cn-hangzhou',
-                        instance_id='********',  # 替换为你的实例ID
-                        page_size=50,
-                        page_number=page
-                    )
-                    
-                    # 发送请求
-                    response = client.describe_domains_with_options(describe_domains_request, util_models.RuntimeOptions())
-
-                    # 将响应转换为字典
-                    response_dict = response.body.to_map()
-
-                    # print(f"打印出{response_dict}详情")
-                    # print(response_dict["Doamins"])
-                    # current_domains = response_dict['Domains']
-
-                    current_domains = response_dict.get('Domains', [])
-                    print(type(current_domains))
-                    # print(f"打印出{current_domains}详情")
-
-                    if not current_domains:  # 如果没有数据，退出循环
-                        break
-                    
-                    # 提取并添加 Domain 值到总列表中
-                    for domain in current_domains:
-                        domain_list = domain.get('Domain')
-                        if domain_list:
-                            all_domains.append(domain_list)
-                            f.write(domain_list + '\n')
-                            # f.write(f"{domain_list}\n")
-
-                    print(f"获取第 {page} 页，当前总域名数: {len(current_domains)}")
-                    # print(f"域名列表：{current_domains}")
-                
-                    # 下一页
-                    page += 1
-
-                # 打印结果
-                print(f"\n总共获取到 {len(all_domains)} 个域名")
-                # print(f"获取到域名列表: {all_domains}")
+            # 连接池不小于并发数；各地域的客户端先在主线程中创建好，并发请求时直接复用
+            configure_http_pool(size=max(export_workers, 10))
+            for region_id, _ in waf_instances:
+                Sample.create_client(region_id)
+            exporter = WafDomainExporter(Sample.create_client, workers=export_workers)
+
+            Sample.write_records(exporter.iter_domains(waf_instances))
+
+            # 输出客户端复用和 API 调用/重试/限流统计
+            client_factory.log_stats()
 
         except Exception as error:
-            print(f"发生错误: {str(error)}")
+            logging.error(f"发生错误: {str(error)}")
 
 
 if __name__ == '__main__':
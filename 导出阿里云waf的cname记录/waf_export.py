@@ -0,0 +1,138 @@
+import csv
+import json
+import time
+import asyncio
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from alibabacloud_waf_openapi20211001 import models as waf_openapi_20211001_models
+from alibabacloud_tea_util import models as util_models
+
+# DescribeDomains 单页最大条数
+PAGE_SIZE = 50
+# 输出的字段
+FIELDS = ['region_id', 'instance_id', 'domain', 'cname', 'status']
+
+
+def parse_instances(spec):
+    """解析 "region:instance_id,region:instance_id" 格式的 WAF 实例列表，返回 [(region_id, instance_id)]"""
+    instances = []
+    for item in spec.split(','):
+        item = item.strip()
+        if item:
+            region_id, _, instance_id = item.partition(':')
+            instances.append((region_id, instance_id))
+    return instances
+
+
+class WafDomainExporter:
+    """
+    并发导出多个 WAF 实例（可跨地域）的域名和 CNAME。
+
+    - 每个实例先取第一页，根据 TotalCount 一次性提交其余页，不再多请求一个空页
+    - 所有实例的所有页共用一个大小为 workers 的线程池
+    - 按页到达的顺序逐条产出记录，失败的页记录在 failed 中，不影响其他页
+    """
+
+    def __init__(self, client_for_region, workers=4):
+        self.client_for_region = client_for_region
+        self.workers = workers
+        self.failed = []
+        self.calls = 0
+
+    def fetch_page(self, region_id, instance_id, page_number):
+        """取一页域名，返回 (记录总数, [记录 dict])"""
+        request = waf_openapi_20211001_models.DescribeDomainsRequest(
+            region_id=region_id,
+            instance_id=instance_id,
+            page_size=PAGE_SIZE,
+            page_number=page_number
+        )
+        response = self.client_for_region(region_id).describe_domains_with_options(request, util_models.RuntimeOptions())
+        body = response.body.to_map()
+        records = [
+            {
+                'region_id': region_id,
+                'instance_id': instance_id,
+                'domain': domain.get('Domain'),
+                'cname': domain.get('Cname'),
+                'status': domain.get('Status'),
+            }
+            for domain in body.get('Domains', [])
+            if domain.get('Domain')
+        ]
+        return body.get('TotalCount', 0), records
+
+    def iter_domains(self, instances):
+        """逐条产出所有实例的域名记录"""
+        started = time.monotonic()
+        count = 0
+        tasks = deque((region_id, instance_id, 1) for region_id, instance_id in instances)
+        running = {}
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            while tasks or running:
+                while tasks and len(running) < self.workers * 2:
+                    task = tasks.popleft()
+                    running[executor.submit(self.fetch_page, *task)] = task
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    region_id, instance_id, page_number = running.pop(future)
+                    self.calls += 1
+                    try:
+                        total_count, records = future.result()
+                    except Exception as error:
+                        self.failed.append((region_id, instance_id, page_number))
+                        logging.warning(f"获取 {region_id}/{instance_id} 第 {page_number} 页失败: {getattr(error, 'message', error)}")
+                        continue
+                    if page_number == 1:
+                        page_count = -(-total_count // PAGE_SIZE)
+                        logging.info(f"[{region_id}/{instance_id}] 共 {total_count} 个域名, {page_count} 页")
+                        tasks.extend((region_id, instance_id, page) for page in range(2, page_count + 1))
+                    count += len(records)
+                    yield from records
+
+        elapsed = time.monotonic() - started
+        logging.info(f"共获取到 {count} 个域名, 调用 {self.calls} 次 API, 耗时 {elapsed:.1f}s, 失败 {len(self.failed)} 页")
+
+
+    async def fetch_instance_async(self, region_id, instance_id, run_blocking):
+        """
+        协程版本：取一个实例的全部域名记录，第一页之后的各页同时提交，
+        每页通过 run_blocking 在线程池中执行；失败的页记入 failed，返回成功取到的记录。
+        """
+        pages = [(region_id, instance_id, 1)]
+        results = await asyncio.gather(run_blocking(self.fetch_page, *pages[0]), return_exceptions=True)
+        if not isinstance(results[0], BaseException):
+            page_count = -(-results[0][0] // PAGE_SIZE)
+            logging.info(f"[{region_id}/{instance_id}] 共 {results[0][0]} 个域名, {page_count} 页")
+            pages += [(region_id, instance_id, page) for page in range(2, page_count + 1)]
+            results += await asyncio.gather(*(run_blocking(self.fetch_page, *task) for task in pages[1:]), return_exceptions=True)
+        records = []
+        for task, result in zip(pages, results):
+            self.calls += 1
+            if isinstance(result, BaseException):
+                self.failed.append(task)
+                logging.warning(f"获取 {region_id}/{instance_id} 第 {task[2]} 页失败: {getattr(result, 'message', result)}")
+                continue
+            records.extend(result[1])
+        return records
+
+
+class RecordWriter:
+    """按 csv 或 jsonl 格式逐条写出记录"""
+
+    def __init__(self, f, fmt='csv'):
+        self.f = f
+        self.fmt = fmt
+        if fmt == 'csv':
+            self.writer = csv.DictWriter(f, fieldnames=FIELDS)
+            self.writer.writeheader()
+        elif fmt != 'jsonl':
+            raise ValueError(f"不支持的输出格式: {fmt}")
+
+    def write(self, record):
+        if self.fmt == 'csv':
+            self.writer.writerow(record)
+        else:
+            self.f.write(json.dumps(record, ensure_ascii=False) + '\n')
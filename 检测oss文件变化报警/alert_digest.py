@@ -0,0 +1,171 @@
+import time
+import html
+import smtplib
+import logging
+import threading
+from collections import defaultdict
+from email.mime.text import MIMEText
+from email.header import Header
+
+
+class UrlSigner:
+    """
+    批量生成对象的签名 URL，并按 key 缓存。
+    缓存的 URL 剩余有效期不少于 min_remaining 秒时直接复用，同一批告警和之后重复出现的对象都不必重复签名。
+    """
+
+    def __init__(self, bucket, expires=3600, min_remaining=1800):
+        self.bucket = bucket
+        self.expires = expires
+        self.min_remaining = min_remaining
+        self.cache = {}
+
+    def sign(self, keys):
+        """返回 {key: 签名 URL}"""
+        now = time.time()
+        urls = {}
+        for key in keys:
+            cached = self.cache.get(key)
+            if cached is None or cached[1] - now < self.min_remaining:
+                cached = (self.bucket.sign_url('GET', key, self.expires), now + self.expires)
+                self.cache[key] = cached
+            urls[key] = cached[0]
+        # 清理已过期的缓存
+        for key in [key for key, (_, expires_at) in self.cache.items() if expires_at <= now]:
+            del self.cache[key]
+        return urls
+
+
+class SmtpSession:
+    """复用一个已登录的 SMTP 连接发送告警，连接断开或出错时重连重试；可被多个告警摘要共用"""
+
+    def __init__(self, smtp_server, smtp_port, from_email, password, retries=2):
+        self.smtp_server = smtp_server
+        self.smtp_port = smtp_port
+        self.from_email = from_email
+        self.password = password
+        self.retries = retries
+        self._server = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        self.close()
+        server = smtplib.SMTP(self.smtp_server, self.smtp_port, timeout=60)
+        server.ehlo()
+        server.starttls()
+        server.ehlo()
+        server.login(self.from_email, self.password)
+        self._server = server
+
+    def close(self):
+        if self._server is not None:
+            try:
+                self._server.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._server = None
+
+    def send(self, msg, to_emails):
+        with self._lock:
+            self._send(msg, to_emails)
+
+    def _send(self, msg, to_emails):
+        for attempt in range(self.retries + 1):
+            try:
+                if self._server is None:
+                    self._connect()
+                self._server.sendmail(self.from_email, to_emails, msg.as_string())
+                return
+            except (smtplib.SMTPServerDisconnected, smtplib.SMTPResponseException, OSError) as e:
+                if attempt == self.retries:
+                    raise
+                logging.warning(f"告警邮件发送失败（第 {attempt + 1} 次），重连后重试: {e}")
+                self.close()
+
+
+def group_of(key, depth=1):
+    """按 key 的前 depth 级目录分组（通常即服务名），根目录下的对象归为 '/'"""
+    parts = key.split('/')[:-1]
+    return '/'.join(parts[:depth]) or '/'
+
+
+class AlertDigest:
+    """
+    告警汇总：把一个时间窗口内产生的变化对象去重、按服务/前缀分组，窗口结束时合并成一封摘要邮件发送。
+
+    - 第一个对象进入后开始计时，window 秒后发送，期间的突发变化都合并到同一封邮件
+    - 每组只列出前 max_links 个对象的签名链接，其余只计数
+    - close() 会立即发送尚未发送的内容，单次运行的脚本在退出前调用
+    """
+
+    def __init__(self, signer, session, to_email, cc_list, subject, window=300, group_depth=1, max_links=20):
+        self.signer = signer
+        self.session = session
+        self.to_email = to_email
+        self.cc_list = cc_list
+        self.subject = subject
+        self.window = window
+        self.group_depth = group_depth
+        self.max_links = max_links
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._send_lock = threading.Lock()
+        self._timer = None
+
+    def add(self, keys, describe):
+        """加入一批变化对象，describe 为变化说明（如 “新增oom日志文件”）"""
+        with self._lock:
+            for key in keys:
+                self._pending.setdefault(key, describe)
+            if self._pending and self._timer is None:
+                self._timer = threading.Timer(self.window, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self):
+        """立即发送当前窗口内的摘要"""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return
+        # 发送期间新到的对象进入下一个窗口，不阻塞 add()
+        with self._send_lock:
+            try:
+                self._send(pending)
+            except (smtplib.SMTPException, OSError) as e:
+                logging.error(f"告警摘要发送失败，{len(pending)} 个文件的告警丢失: {e}")
+
+    def close(self, close_session=True):
+        self.flush()
+        if close_session:
+            self.session.close()
+
+    def _send(self, pending):
+        groups = defaultdict(list)
+        for key in sorted(pending):
+            groups[group_of(key, self.group_depth)].append(key)
+        shown = [key for keys in groups.values() for key in keys[:self.max_links]]
+        urls = self.signer.sign(shown)
+
+        parts = [f"Hi All,<br/><br/>后端服务发生了OOM事件,请及时查看。最近 {len(pending)} 个文件变化，涉及 {len(groups)} 个服务:<br/>"]
+        for group, keys in sorted(groups.items(), key=lambda item: -len(item[1])):
+            describes = '、'.join(sorted({pending[key] for key in keys}))
+            parts.append(f"<h3>{html.escape(group)}（{len(keys)} 个，{html.escape(describes)}）</h3>\n<ul>\n")
+            for key in keys[:self.max_links]:
+                parts.append(f'<li><a href="{html.escape(urls[key])}">{html.escape(key)}</a></li>\n')
+            if len(keys) > self.max_links:
+                parts.append(f"<li>……其余 {len(keys) - self.max_links} 个文件未列出</li>\n")
+            parts.append("</ul>\n")
+        parts.append(f"<br/>签名链接有效期 {self.signer.expires // 60} 分钟。")
+
+        msg = MIMEText(''.join(parts), 'html')
+        msg['From'] = self.session.from_email
+        msg['To'] = self.to_email
+        msg['Subject'] = Header(self.subject, 'utf-8')
+        msg['Cc'] = ", ".join(self.cc_list)
+        to_emails = [self.to_email] + self.cc_list
+        self.session.send(msg, to_emails)
+        logging.info(f"告警摘要已发送至：{to_emails}，共 {len(pending)} 个文件，{len(groups)} 个分组")
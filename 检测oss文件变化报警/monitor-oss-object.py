@@ -1,17 +1,59 @@
 import os
+import sys
 import oss2
-from oss2.credentials import EnvironmentVariableCredentialsProvider
-import json
-import smtplib
-from email.mime.text import MIMEText
-from email.header import Header
 import logging  # 引入 logging 模块
+import time
 from datetime import timedelta
 
+from oss_listing import iter_objects_sharded, iter_new_objects
+from scan_state import ScanStateStore, etag_hash
+from oss_events import open_event_source, run_event_loop
+from alert_digest import AlertDigest, SmtpSession, UrlSigner
+from oss_daemon import load_bucket_config, run_daemon
+
+# 仓库根目录下的共用模块 aliyun_common
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from aliyun_common import client_factory, credential_from_env
+
 # 设置SMTP服务器参数
 smtp_server = 'smtp.office365.com'
 smtp_port = 587
+from_email = "******"
+email_password = '*****'  # 您的邮箱应用密码
+to_email = "barry.jiang@******.com"
+cc_list = ["barry.jiang@****.com",]
+subject = "主题: Java项目OSS发生OOM事件告警"
+
+# 告警摘要：定期扫描发现的变化在窗口内合并为一封邮件（事件驱动模式收到的新增对象不等窗口，立即发送），按 key 的前 N 级目录（服务名）分组，每组最多列出的链接数
+alert_window = int(os.environ.get('OSS_ALERT_WINDOW', '300'))
+alert_group_depth = int(os.environ.get('OSS_ALERT_GROUP_DEPTH', '1'))
+alert_max_links = int(os.environ.get('OSS_ALERT_MAX_LINKS', '20'))
+
+# 并发列举的线程数（按顶层前缀分片）
+scan_workers = int(os.environ.get('OSS_SCAN_WORKERS', '8'))
+
+# 扫描模式: full 每次全量列举; incremental 按分片水位线只列举新增的 key，
+# 距上次全量扫描超过 full_scan_interval 秒时仍做一次全量扫描，以发现覆盖写入和删除
+scan_mode = os.environ.get('OSS_SCAN_MODE', 'full')
+full_scan_interval = int(os.environ.get('OSS_FULL_SCAN_INTERVAL', '86400'))
+
+# 事件驱动模式：设置事件源后常驻运行，收到新增对象事件即告警，全量扫描只作为低频对账
+# 事件源格式: http://127.0.0.1:8080（接收 OSS 事件通知推送）或 file:/path/to/events.jsonl（跟踪读取本地事件文件）
+event_source_spec = os.environ.get('OSS_EVENT_SOURCE', '')
+# HTTP 事件接收端的共享密钥，推送方在 X-Event-Token 请求头或 ?token= 参数中携带；监听非本机地址时必须设置
+event_source_token = os.environ.get('OSS_EVENT_TOKEN', '')
+# 全量对账扫描的间隔（秒）
+reconcile_interval = int(os.environ.get('OSS_RECONCILE_INTERVAL', '3600'))
+# 同一批事件的聚合窗口（秒）
+event_batch_window = float(os.environ.get('OSS_EVENT_BATCH_WINDOW', '5'))
 
+# 多桶守护进程模式：设置存储桶列表配置文件后常驻运行，按各桶的间隔定时并发扫描
+# 配置格式见 oss_daemon.load_bucket_config，每个桶的扫描状态保存在 state_dir/<桶名>.db
+buckets_config = os.environ.get('OSS_BUCKETS_CONFIG', '')
+state_dir = os.environ.get('OSS_STATE_DIR', 'scan-state')
+# 同时扫描的桶数，以及配置中未指定间隔时的默认扫描间隔（秒）
+daemon_workers = int(os.environ.get('OSS_DAEMON_WORKERS', '4'))
+daemon_interval = int(os.environ.get('OSS_DAEMON_INTERVAL', '300'))
 
 # 确保日志目录存在
 log_dir = 'log'
@@ -30,116 +72,199 @@ logging.basicConfig(
 )
 
 # 初始化OSS认证和Bucket对象
+# 连接池不小于并发列举的线程数（守护进程模式下同一 endpoint 的多个桶共用连接池）
+oss2.defaults.connection_pool_size = max(scan_workers * (daemon_workers if buckets_config else 1), oss2.defaults.connection_pool_size)
 # 从环境变量中获取访问凭证。运行本代码示例之前，请确保已设置环境变量OSS_ACCESS_KEY_ID和OSS_ACCESS_KEY_SECRET。
-auth = oss2.ProviderAuth(EnvironmentVariableCredentialsProvider())
-# yourBucketName填写存储空间名称。
-bucket = oss2.Bucket(auth, 'https://oss-cn-shanghai.aliyuncs.com', 'test-oom-dump')
+# 另外设置 OSS_ROLE_ARN 时通过 STS 扮演该角色，临时凭证到期前自动刷新
+# 账号名为 oss，与使用 ALIBABA_CLOUD_* 凭证的其他工具在同一进程中运行时互不影响
+client_factory.add_account('oss', credential_from_env('OSS'))
+# yourBucketName填写存储空间名称。Bucket 由共用的客户端工厂创建，同一 endpoint 的桶共用连接池
+bucket = client_factory.oss_bucket('oss', 'https://oss-cn-shanghai.aliyuncs.com', 'test-oom-dump')
+
+# 签名URL有效期1小时
+alert_digest = AlertDigest(
+    UrlSigner(bucket, expires=int(timedelta(hours=1).total_seconds())),
+    SmtpSession(smtp_server, smtp_port, from_email, email_password),
+    to_email, cc_list, subject,
+    window=alert_window, group_depth=alert_group_depth, max_links=alert_max_links,
+)
 
 
 def get_last_scan_results_filepath():
-    """获取保存上次扫描结果的文件路径"""
+    """获取旧版保存上次扫描结果的 JSON 文件路径（仅用于自动导入）"""
     script_dir = os.path.dirname(os.path.abspath(__file__))
     return os.path.join(script_dir, 'last_scan_results.json')
 
-def load_last_scan_results():
-    """加载上次扫描结果"""
-    filepath = get_last_scan_results_filepath()
-    try:
-        with open(filepath, mode='rt') as f:
-            last_scan_results = json.load(f)
-        return last_scan_results
-    except FileNotFoundError:
-        return {}
-
-def save_to_file(data):
-    """将序列化的结果写入文件"""
-    filepath = get_last_scan_results_filepath()
-    os.makedirs(os.path.dirname(filepath), exist_ok=True)  # 确保目录存在
-    with open(filepath, mode='wt') as f:
-        json.dump(data, f)
-
-
+def get_scan_state_filepath():
+    """获取扫描状态库（SQLite）的文件路径"""
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(script_dir, 'scan_state.db')
 
+def load_scan_state():
+    """打开扫描状态库，首次使用时自动导入旧的 last_scan_results.json"""
+    return ScanStateStore(get_scan_state_filepath(), legacy_json_path=get_last_scan_results_filepath())
 
-def get_current_scan_results(bucket):
-    """获取当前桶中的所有文件及其元数据"""
-    current_scan_results = {}
-    for obj in oss2.ObjectIterator(bucket):
-        current_scan_results[obj.key] = {'size': obj.size, 'etag': obj.etag}
-    return current_scan_results
 
-def compare_and_alert(current_scan_results, last_scan_results):
-    """比较当前和上次扫描结果，必要时发送告警邮件"""
+def compare_and_alert(bucket, scan_state, digest=None):
+    """流式比较当前列举结果和扫描状态库中的上次结果，同时更新状态库，必要时发送告警邮件；返回变化的文件数"""
     new_or_updated_files = []
     deleted_files = []
 
-    # 查找新增或更新的文件
-    for key in current_scan_results:
-        if key not in last_scan_results or current_scan_results[key]['etag'] != last_scan_results.get(key, {}).get('etag'):
+    for event, key, size in scan_state.sync(iter_objects_sharded(bucket, scan_workers)):
+        if event == 'deleted':
+            deleted_files.append(key)
+        else:
             new_or_updated_files.append(key)
+    scan_state.mark_full_scan()
 
-    # # 查找已删除的文件
-    # for key in last_scan_results:
-    #     if key not in current_scan_results:
-    #         deleted_files.append(key)
+    if deleted_files:
+        logging.info(f"已删除的文件 {len(deleted_files)} 个: {deleted_files[:20]}")
 
     if new_or_updated_files:
-        send_alert_email_with_signed_urls(new_or_updated_files, "新增oom日志文件")
-        logging.info("关于新增或更新的日志文件的告警邮件已发送成功")
+        send_alert_email_with_signed_urls(new_or_updated_files, "新增oom日志文件", digest)
+    return len(new_or_updated_files) + len(deleted_files)
 
 
-def send_alert_email_with_signed_urls(files, describe):
-    if files:
-        file_urls = []
-        expire_time = timedelta(hours=1)  # 签名URL有效期1小时
-
-        for file in files:
-            signed_url = bucket.sign_url('GET', file, int(expire_time.total_seconds()))
-            file_urls.append(signed_url)
-
-        links_html = '<ul>\n'
-        for url in file_urls:
-            links_html += f'<li><a href="{url}">{url}</a></li>\n'
-        links_html += '</ul>'
-
-        smtp_server = 'smtp.office365.com'
-        smtp_port = 587
-        from_email = "******"
-        email_password = '*****'  # 您的邮箱应用密码 
-        to_email  = "barry.jiang@******.com"
-        # subject = f"OSS Storage Bucket File {status} Alert"
-     
-        cc_list = ["barry.jiang@****.com",]
-        subject = "主题: Java项目OSS发生OOM事件告警"
-        body = f"Hi All,<br/><br/>后端服务发生了OOM事件,请及时查看,<br/>{describe.capitalize()} files: {files} <br/> 文件链接: <br/>\n{links_html}"
-
-        msg = MIMEText(body, 'html')
-        msg['From'] = from_email
-        msg['To'] = to_email
-        msg['Subject'] = Header(subject, 'utf-8')
-        msg['Cc'] = ", ".join(cc_list)
-
-        server = smtplib.SMTP(smtp_server, smtp_port)
-        server.ehlo()
-        server.starttls()
-        server.login(from_email, email_password)
-        to_emails = [to_email] + cc_list
-
-        server.sendmail(from_email, to_emails, msg.as_string())
-        logging.info(f"邮件已成功发送至：{to_emails} 和抄送至 {', '.join(cc_list)}")
-        server.quit()
+def incremental_compare_and_alert(bucket, scan_state, digest=None):
+    """
+    增量扫描：每个分片只列举水位线之后的 key，扫描成本与新增对象数成正比。
+    只能发现 key 排在水位线之后的新对象，水位线之前的覆盖写入和删除由定期的全量扫描发现。
+    """
+    new_or_updated_files = []
+    for prefix, direct, objects in iter_new_objects(bucket, scan_state.watermark, scan_workers):
+        for event, key, size in scan_state.advance(prefix, objects, direct):
+            new_or_updated_files.append(key)
 
+    if new_or_updated_files:
+        send_alert_email_with_signed_urls(new_or_updated_files, "新增oom日志文件", digest)
+    return len(new_or_updated_files)
 
 
-if __name__ == "__main__":
-    # 加载上次扫描结果
-    last_scan_results = load_last_scan_results()
+def scan_and_alert(bucket, scan_state, mode=None, digest=None):
+    """按扫描模式（默认 scan_mode）选择全量或增量扫描，返回变化的文件数"""
+    if (mode or scan_mode) == 'incremental' and time.time() - scan_state.last_full_scan() < full_scan_interval:
+        return incremental_compare_and_alert(bucket, scan_state, digest)
+    return compare_and_alert(bucket, scan_state, digest)
+
+
+def handle_created_events(bucket, scan_state, events):
+    """
+    处理一批新增对象事件：去重、写入扫描状态库，然后告警；状态库中已有相同版本的对象不再告警。
+    事件内容不作为依据，每个对象都用 head_object 确认存在并取实际的 etag/size，对象已不存在时不告警。
+    """
+    keys = dict.fromkeys(event.key for event in events)
+
+    upserts = []
+    for key in keys:
+        try:
+            meta = bucket.head_object(key)
+        except oss2.exceptions.NotFound:
+            logging.info(f"事件中的对象已不存在，忽略: {key}")
+            continue
+        etag, size = meta.etag, meta.content_length
+        if scan_state.get(key) == (etag_hash(etag), size):
+            continue
+        upserts.append((key, etag, size))
 
-    # 获取当前扫描结果
-    current_scan_results = get_current_scan_results(bucket)
+    if not upserts:
+        return
+    scan_state.apply(upserts)
+    new_files = [key for key, _, _ in upserts]
+    logging.info(f"事件检测到新增文件 {len(new_files)} 个")
+    # 事件已按 event_batch_window 聚合过，立即发送，不再等待摘要窗口
+    send_alert_email_with_signed_urls(new_files, "新增oom日志文件", flush=True)
 
-    # 比较并处理差异
-    compare_and_alert(current_scan_results, last_scan_results)
 
-    # 保存当前扫描结果
-    save_to_file(current_scan_results)
+def run_event_mode(bucket, scan_state):
+    """事件驱动模式：先做一次全量对账，然后持续消费事件，并按 reconcile_interval 定期对账"""
+    source = open_event_source(event_source_spec, event_source_token)
+    try:
+        compare_and_alert(bucket, scan_state)
+        run_event_loop(
+            source, bucket.bucket_name,
+            on_created=lambda events: handle_created_events(bucket, scan_state, events),
+            reconcile=lambda: compare_and_alert(bucket, scan_state),
+            reconcile_interval=reconcile_interval,
+            batch_window=event_batch_window,
+        )
+    finally:
+        source.close()
+
+
+def scan_bucket_job(job):
+    """守护进程模式下扫描一个桶，每个桶使用独立的状态库；返回 (对象数, 变化数)"""
+    scan_state = ScanStateStore(os.path.join(state_dir, f'{job.name}.db'))
+    try:
+        changes = scan_and_alert(job.bucket, scan_state, job.scan_mode, job.digest)
+        return len(scan_state), changes
+    finally:
+        scan_state.close()
+
+
+def load_bucket_jobs():
+    """按存储桶列表配置创建各桶的扫描任务，各桶的告警摘要共用一个 SMTP 会话"""
+    jobs = load_bucket_config(buckets_config, default_interval=daemon_interval)
+    for job in jobs:
+        job.bucket = client_factory.oss_bucket('oss', job.endpoint, job.name)
+        job.digest = AlertDigest(
+            UrlSigner(job.bucket, expires=int(timedelta(hours=1).total_seconds())),
+            alert_digest.session,
+            to_email, cc_list, f"{subject} [{job.name}]",
+            window=alert_window, group_depth=alert_group_depth, max_links=alert_max_links,
+        )
+    return jobs
+
+
+def scan_default_bucket():
+    """单桶模式扫描一次（统一调度入口 run-all-jobs.py 使用）"""
+    scan_state = load_scan_state()
+    try:
+        return scan_and_alert(bucket, scan_state)
+    finally:
+        scan_state.close()
+
+
+def run_daemon_mode():
+    """守护进程模式：按存储桶列表配置定时并发扫描多个桶"""
+    jobs = load_bucket_jobs()
+    logging.info(f"守护进程模式: 监控 {len(jobs)} 个桶, 涉及 {len(client_factory.oss_sessions)} 个 endpoint")
+    try:
+        run_daemon(jobs, scan_bucket_job, workers=daemon_workers)
+    finally:
+        for job in jobs:
+            job.digest.close(close_session=False)
+
+
+def send_alert_email_with_signed_urls(files, describe, digest=None, flush=False):
+    """把变化的文件加入告警摘要，同一窗口内的文件合并到一封邮件中发送；flush 为 True 时立即发送"""
+    if files:
+        digest = digest or alert_digest
+        digest.add(files, describe)
+        logging.info(f"{len(files)} 个文件已加入告警摘要")
+        if flush:
+            digest.flush()
+
+
+if __name__ == "__main__":
+    if buckets_config:
+        # 多桶守护进程模式，常驻运行
+        try:
+            run_daemon_mode()
+        finally:
+            alert_digest.close()
+        raise SystemExit
+
+    # 加载上次扫描结果
+    scan_state = load_scan_state()
+
+    try:
+        if event_source_spec:
+            # 事件驱动模式，常驻运行
+            run_event_mode(bucket, scan_state)
+        else:
+            # 列举当前文件，与上次扫描结果比较并处理差异，同时更新扫描状态
+            scan_and_alert(bucket, scan_state)
+    finally:
+        scan_state.close()
+        # 发送尚未到窗口结束的告警摘要
+        alert_digest.close()
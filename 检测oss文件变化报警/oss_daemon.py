@@ -0,0 +1,102 @@
+import json
+import time
+import heapq
+import logging
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+
+class BucketJob:
+    """一个被监控的存储桶：配置、Bucket 对象、告警摘要和扫描指标"""
+
+    def __init__(self, name, endpoint, interval=300, scan_mode=None):
+        self.name = name
+        self.endpoint = endpoint
+        self.interval = interval
+        self.scan_mode = scan_mode
+        self.bucket = None
+        self.digest = None
+        self.runs = 0
+        self.errors = 0
+        self.last_latency = None
+        self.last_objects = None
+        self.last_changes = None
+
+    def record(self, latency, objects, changes):
+        self.runs += 1
+        self.last_latency = latency
+        self.last_objects = objects
+        self.last_changes = changes
+
+
+def load_bucket_config(path, default_interval=300):
+    """
+    读取存储桶列表配置:
+    {"buckets": [{"name": "test-oom-dump", "endpoint": "https://oss-cn-shanghai.aliyuncs.com",
+                  "interval": 300, "scan_mode": "incremental"}]}
+    interval、scan_mode 可省略
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        config = json.load(f)
+    return [
+        BucketJob(item['name'], item['endpoint'], item.get('interval', default_interval), item.get('scan_mode'))
+        for item in config['buckets']
+    ]
+
+
+def log_metrics(jobs):
+    """输出每个桶最近一次扫描的耗时和对象数"""
+    for job in jobs:
+        if job.runs:
+            logging.info(
+                f"[{job.name}] 扫描 {job.runs} 次, 失败 {job.errors} 次, 最近一次耗时 {job.last_latency:.1f}s, "
+                f"对象 {job.last_objects} 个, 变化 {job.last_changes} 个"
+            )
+
+
+def run_daemon(jobs, scan, workers=4, metrics_interval=600):
+    """
+    常驻运行，按各桶的 interval 定时扫描，最多 workers 个桶同时扫描。
+    scan(job) 执行一次扫描并返回 (对象数, 变化数)；同一个桶上一次扫描未结束时不会重复提交。
+    """
+    if not jobs:
+        logging.warning("存储桶列表为空，不需要监控")
+        return
+    schedule = [(time.monotonic(), index) for index in range(len(jobs))]
+    heapq.heapify(schedule)
+    running = {}
+    next_metrics = time.monotonic() + metrics_interval
+
+    def run(job):
+        started = time.monotonic()
+        objects, changes = scan(job)
+        return time.monotonic() - started, objects, changes
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while True:
+            now = time.monotonic()
+            while schedule and schedule[0][0] <= now and len(running) < workers:
+                _, index = heapq.heappop(schedule)
+                running[executor.submit(run, jobs[index])] = index
+
+            timeout = max(schedule[0][0] - now, 0.1) if schedule and len(running) < workers else None
+            if running:
+                done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+            else:
+                time.sleep(timeout)
+                done = ()
+
+            for future in done:
+                index = running.pop(future)
+                job = jobs[index]
+                try:
+                    latency, objects, changes = future.result()
+                    job.record(latency, objects, changes)
+                    logging.info(f"[{job.name}] 扫描完成: 耗时 {latency:.1f}s, 对象 {objects} 个, 变化 {changes} 个")
+                except Exception as e:
+                    job.errors += 1
+                    logging.error(f"[{job.name}] 扫描失败: {e}")
+                heapq.heappush(schedule, (time.monotonic() + job.interval, index))
+
+            if time.monotonic() >= next_metrics:
+                log_metrics(jobs)
+                next_metrics = time.monotonic() + metrics_interval
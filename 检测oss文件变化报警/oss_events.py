@@ -0,0 +1,208 @@
+import os
+import hmac
+import json
+import time
+import queue
+import base64
+import logging
+import threading
+from urllib.parse import unquote, urlsplit, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class OssEvent:
+    """一条 OSS 对象事件"""
+
+    def __init__(self, event_name, bucket, key, size=None, etag=None):
+        self.event_name = event_name
+        self.bucket = bucket
+        self.key = key
+        self.size = size
+        self.etag = etag
+
+    @property
+    def is_created(self):
+        return self.event_name.startswith('ObjectCreated')
+
+    def __repr__(self):
+        return f"OssEvent({self.event_name}, {self.bucket}/{self.key})"
+
+
+def parse_oss_events(payload):
+    """
+    解析 OSS 事件通知，支持以下几种投递格式：
+      - OSS 事件通知原始格式 {"events": [...]}，MNS 推送时可能整体做了 base64 编码
+      - EventBridge 投递的 CloudEvents 格式 {"data": {...单个事件...}}
+      - 单个事件 {"eventName": ..., "oss": {...}}
+    """
+    if isinstance(payload, bytes):
+        payload = payload.decode('utf-8')
+    payload = payload.strip()
+    try:
+        data = json.loads(payload)
+    except json.JSONDecodeError:
+        data = json.loads(base64.b64decode(payload).decode('utf-8'))
+
+    if 'events' in data:
+        raw_events = data['events']
+    elif 'data' in data:
+        raw_events = [data['data']]
+    else:
+        raw_events = [data]
+
+    events = []
+    for raw in raw_events:
+        oss = raw.get('oss', {})
+        obj = oss.get('object', {})
+        if 'key' not in obj:
+            continue
+        events.append(OssEvent(
+            raw.get('eventName', ''),
+            oss.get('bucket', {}).get('name'),
+            unquote(obj['key']),
+            obj.get('size'),
+            obj.get('eTag'),
+        ))
+    return events
+
+
+LOOPBACK_HOSTS = ('127.0.0.1', 'localhost', '::1')
+
+
+class HttpEventSource:
+    """
+    本地 HTTP 接收端：OSS 事件通知（MNS 主题 HTTP 订阅或 EventBridge HTTP 目标）POST 到这里，
+    解析后放入队列，由监控主循环消费。
+
+    默认只监听 127.0.0.1（由本机的反向代理或采集程序转发）。设置 token 后请求必须在
+    X-Event-Token 请求头或 ?token= 参数中带上相同的值；监听非本机地址时必须设置 token。
+    """
+
+    def __init__(self, host='127.0.0.1', port=8080, token=None):
+        if host not in LOOPBACK_HOSTS and not token:
+            raise ValueError(f"事件接收端监听 {host} 时必须设置共享密钥 token")
+        self.events = queue.Queue()
+        source = self
+
+        def authorized(handler):
+            if not token:
+                return True
+            supplied = handler.headers.get('X-Event-Token') or parse_qs(urlsplit(handler.path).query).get('token', [''])[0]
+            return hmac.compare_digest(supplied.encode('utf-8'), token.encode('utf-8'))
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                if not authorized(self):
+                    logging.warning(f"拒绝未授权的事件通知: {self.client_address[0]}")
+                    self.send_response(401)
+                    self.end_headers()
+                    return
+                try:
+                    for event in parse_oss_events(body):
+                        source.events.put(event)
+                    self.send_response(204)
+                except (ValueError, KeyError, AttributeError) as e:
+                    logging.warning(f"无法解析的事件通知: {e}")
+                    self.send_response(400)
+                self.end_headers()
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self.server.serve_forever, name='oss-event-http', daemon=True).start()
+        logging.info(f"事件接收端已启动: http://{host}:{self.server.server_port}")
+
+    def get(self, timeout):
+        """取一条事件，超时返回 None"""
+        try:
+            return self.events.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.server.shutdown()
+
+
+class JsonlEventSource:
+    """
+    跟踪读取本地文件中的事件，每行一条事件通知（格式同 parse_oss_events）。
+    可以对接把 OSS 事件或访问日志落盘的采集程序，也可在本地测试时代替真实事件源。
+    """
+
+    def __init__(self, path, poll_interval=1.0):
+        self.path = path
+        self.poll_interval = poll_interval
+        self.pending = []
+        self.file = None
+
+    def get(self, timeout):
+        deadline = time.monotonic() + timeout
+        while not self.pending:
+            if self.file is None and os.path.exists(self.path):
+                self.file = open(self.path, 'r', encoding='utf-8')
+            line = self.file.readline() if self.file else ''
+            if line.endswith('\n'):
+                if line.strip():
+                    try:
+                        self.pending.extend(parse_oss_events(line))
+                    except (ValueError, KeyError, AttributeError) as e:
+                        logging.warning(f"无法解析的事件: {e}")
+                continue
+            if line:
+                # 行还没写完，回退等待下次读取
+                self.file.seek(self.file.tell() - len(line.encode('utf-8')))
+            if time.monotonic() >= deadline:
+                return None
+            time.sleep(min(self.poll_interval, max(deadline - time.monotonic(), 0)))
+        return self.pending.pop(0)
+
+    def close(self):
+        if self.file:
+            self.file.close()
+
+
+def open_event_source(spec, token=None):
+    """按配置创建事件源: http://host:port（token 为 HTTP 接收端的共享密钥）或 file:/path/to/events.jsonl"""
+    if spec.startswith('http://'):
+        host, _, port = spec[len('http://'):].rstrip('/').partition(':')
+        return HttpEventSource(host or '127.0.0.1', int(port or 8080), token)
+    if spec.startswith('file:'):
+        return JsonlEventSource(spec[len('file:'):])
+    raise ValueError(f"不支持的事件源: {spec}")
+
+
+def run_event_loop(source, bucket_name, on_created, reconcile, reconcile_interval=3600, batch_window=5):
+    """
+    事件驱动的监控主循环：
+      - 收到本桶的 ObjectCreated 事件后，最多再等 batch_window 秒收集同一批事件，然后调用 on_created(events)
+      - 每隔 reconcile_interval 秒调用一次 reconcile() 做全量对账，补上丢失的事件
+    单批事件处理或单次对账失败只记录日志，主循环继续运行（丢掉的事件由下次对账补上）。
+    """
+    next_reconcile = time.monotonic() + reconcile_interval
+    batch = []
+    batch_deadline = None
+    while True:
+        now = time.monotonic()
+        wait_until = min(next_reconcile, batch_deadline or next_reconcile)
+        event = source.get(timeout=max(wait_until - now, 0.1))
+        if event is not None and event.is_created and event.bucket in (None, bucket_name):
+            batch.append(event)
+            if batch_deadline is None:
+                batch_deadline = time.monotonic() + batch_window
+
+        now = time.monotonic()
+        if batch and now >= batch_deadline:
+            try:
+                on_created(batch)
+            except Exception as e:
+                logging.exception(f"处理 {len(batch)} 个事件失败，等待下次对账补上: {e}")
+            batch, batch_deadline = [], None
+        if now >= next_reconcile:
+            logging.info("开始全量对账扫描")
+            try:
+                reconcile()
+            except Exception as e:
+                logging.exception(f"全量对账扫描失败: {e}")
+            next_reconcile = time.monotonic() + reconcile_interval
@@ -0,0 +1,251 @@
+import time
+import queue
+import logging
+import threading
+import oss2
+from concurrent.futures import ThreadPoolExecutor
+
+LIST_PAGE_SIZE = 1000  # 单次 ListObjectsV2 返回的最大条数（OSS 上限）
+SHARD_QUEUE_PAGES = 2  # 每个分片列举线程最多提前缓冲的页数
+
+
+def _expand(bucket, prefix):
+    """
+    用 delimiter='/' 列出 prefix 下一级的目录前缀。
+    第一页（LIST_PAGE_SIZE 条）中没有子目录时视为叶子目录，不再继续翻页，返回 []：
+    把它整体作为一个分片列举总是正确的，只是其中的子目录不再并行。
+    """
+    sub_prefixes = []
+    objects = 0
+    for obj in oss2.ObjectIteratorV2(bucket, prefix=prefix, delimiter='/', max_keys=LIST_PAGE_SIZE):
+        if obj.is_prefix():
+            sub_prefixes.append(obj.key)
+        else:
+            objects += 1
+            if not sub_prefixes and objects >= LIST_PAGE_SIZE:
+                return []
+    return sub_prefixes
+
+
+def discover_shards(bucket, workers, max_depth=3):
+    """
+    用 delimiter='/' 逐层展开目录前缀作为分片，直到分片数不少于 workers 或达到 max_depth 层，同一层的目录并发展开。
+    没有子目录的目录（叶子目录）直接作为分片，不会因为下一层为空而丢掉整层分片。
+    返回 (分片前缀列表, 已展开的目录前缀列表)；已展开目录下直接存放的对象不属于任何分片，需要用 delimiter 单独列举。
+    """
+    shards = []
+    expanded = []
+    frontier = ['']
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for _ in range(max_depth):
+            if not frontier or len(shards) + len(frontier) >= workers:
+                break
+            next_frontier = []
+            for prefix, sub_prefixes in zip(frontier, executor.map(lambda prefix: _expand(bucket, prefix), frontier)):
+                if sub_prefixes:
+                    expanded.append(prefix)
+                    next_frontier.extend(sub_prefixes)
+                else:
+                    shards.append(prefix)
+            frontier = next_frontier
+    shards.extend(frontier)
+    return sorted(shards), sorted(expanded)
+
+
+def _parent(prefix):
+    """目录前缀的上一级目录，'a/b/' -> 'a/'，'a/' -> ''"""
+    return prefix[:prefix.rstrip('/').rfind('/') + 1]
+
+
+def _put(out, item, stop):
+    """放入有界队列，队列满时等待；消费方已停止（stop 被设置）时放弃并返回 False"""
+    while not stop.is_set():
+        try:
+            out.put(item, timeout=0.5)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def list_pages(bucket, prefix, start_after, put, delimiter=''):
+    """
+    分页列举 prefix 下 key 大于 start_after 的对象，每页（最多 LIST_PAGE_SIZE 个对象）调用一次 put(页)，
+    列举结束时 put(None)，出错时 put(异常)。put 返回 False 表示消费方已停止，不再继续列举。
+    delimiter='/' 时只列举直接存放在 prefix 下的对象，跳过子目录。
+    """
+    try:
+        page = []
+        for obj in oss2.ObjectIteratorV2(bucket, prefix=prefix, delimiter=delimiter, start_after=start_after or '', max_keys=LIST_PAGE_SIZE):
+            if obj.is_prefix():
+                continue
+            page.append(obj)
+            if len(page) >= LIST_PAGE_SIZE:
+                if not put(page):
+                    return
+                page = []
+        if page and not put(page):
+            return
+        put(None)
+    except Exception as e:
+        put(e)
+
+
+class _Listing:
+    """一个列举任务的输出：从有界队列中按 key 顺序逐个取对象，可以先查看下一个对象"""
+
+    def __init__(self, out):
+        self.out = out
+        self.page = []
+        self.position = 0
+        self.done = False
+
+    def peek(self):
+        while self.position >= len(self.page):
+            if self.done:
+                return None
+            item = self.out.get()
+            if item is None:
+                self.done = True
+                return None
+            if isinstance(item, Exception):
+                raise item
+            self.page, self.position = item, 0
+        return self.page[self.position]
+
+    def pop(self):
+        obj = self.peek()
+        self.position += 1
+        return obj
+
+    def __iter__(self):
+        while self.peek() is not None:
+            yield self.pop()
+
+
+def iter_objects_sharded(bucket, workers=8, max_depth=3):
+    """
+    按前缀分片并发列举桶内所有对象，按 key 字典序逐个返回（与 ObjectIterator 顺序一致）。
+
+    每个分片和每个已展开目录下直接存放的对象（delimiter 列举）都是一个列举任务，逐页放入最多缓冲
+    SHARD_QUEUE_PAGES 页的有界队列；任务按消费顺序提前启动，最多提前 workers 个。正在消费的任务
+    （当前分片及其各级上层目录）最多 max_depth + 1 个，内存中最多约
+    (workers + max_depth + 1) × (SHARD_QUEUE_PAGES + 1) × LIST_PAGE_SIZE 个对象，与桶和分片大小无关。
+    """
+    started = time.monotonic()
+    shards, expanded = discover_shards(bucket, workers, max_depth)
+    children = {}
+    for prefix in shards + expanded:
+        if prefix:
+            children.setdefault(_parent(prefix), []).append(prefix)
+    for prefixes in children.values():
+        prefixes.sort()
+    expanded = set(expanded)
+
+    # 列举任务按开始消费的顺序排列（深度优先）：已展开目录先列其直接存放的对象，再依次列各子目录
+    tasks = []
+
+    def plan(prefix):
+        if prefix not in expanded:
+            tasks.append(('shard', prefix))
+            return
+        tasks.append(('loose', prefix))
+        for child in children.get(prefix, ()):
+            plan(child)
+
+    plan('')
+    count = 0
+    stop = threading.Event()
+
+    with ThreadPoolExecutor(max_workers=workers + max_depth + 1) as executor:
+        queues = {}
+        pending = iter(tasks)
+
+        def prefetch():
+            while len(queues) < workers:
+                task = next(pending, None)
+                if task is None:
+                    return
+                kind, prefix = task
+                out = queue.Queue(SHARD_QUEUE_PAGES)
+                queues[task] = _Listing(out)
+                executor.submit(
+                    list_pages, bucket, prefix, None, lambda item, out=out: _put(out, item, stop),
+                    '/' if kind == 'loose' else ''
+                )
+
+        def take(task):
+            prefetch()
+            listing = queues.pop(task)
+            prefetch()
+            return listing
+
+        def walk(prefix):
+            # 直接存放的对象与子目录按 key 交错输出：子目录前缀之前的对象先输出，再输出整个子目录
+            if prefix not in expanded:
+                yield from take(('shard', prefix))
+                return
+            loose = take(('loose', prefix))
+            for child in children.get(prefix, ()):
+                while loose.peek() is not None and loose.peek().key < child:
+                    yield loose.pop()
+                yield from walk(child)
+            yield from loose
+
+        try:
+            for obj in walk(''):
+                count += 1
+                yield obj
+        finally:
+            # 提前结束或出错时通知列举线程退出
+            stop.set()
+
+    elapsed = time.monotonic() - started
+    rate = count / elapsed if elapsed else 0
+    logging.info(
+        f"[{bucket.bucket_name}] 列举完成: {len(shards)} 个分片, {count} 个对象, "
+        f"耗时 {elapsed:.1f}s, {rate:.0f} 个/秒"
+    )
+
+
+def iter_new_objects(bucket, watermark, workers=8):
+    """
+    增量列举：每个分片只列出 key 大于 watermark(prefix, False) 的对象（start-after），并发执行；
+    已展开目录下直接存放的对象用 delimiter 单独列举，从 watermark(prefix, True) 之后开始。
+    按到达顺序逐页产出 (前缀, 是否只列直接存放的对象, 对象列表)，同一前缀的页按 key 递增。
+    所有列举任务共用一个最多缓冲 workers × SHARD_QUEUE_PAGES 页的有界队列。
+    watermark 在调用线程中执行，可以直接查询状态库。
+    """
+    started = time.monotonic()
+    shards, expanded = discover_shards(bucket, workers)
+    listings = [(prefix, False) for prefix in shards] + [(prefix, True) for prefix in expanded]
+    count = 0
+
+    stop = threading.Event()
+    out = queue.Queue(workers * SHARD_QUEUE_PAGES)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for prefix, direct in listings:
+            executor.submit(
+                list_pages, bucket, prefix, watermark(prefix, direct),
+                lambda item, prefix=prefix, direct=direct: _put(out, (prefix, direct, item), stop),
+                '/' if direct else ''
+            )
+        try:
+            remaining = len(listings)
+            while remaining:
+                prefix, direct, page = out.get()
+                if page is None:
+                    remaining -= 1
+                    continue
+                if isinstance(page, Exception):
+                    raise page
+                count += len(page)
+                yield prefix, direct, page
+        finally:
+            stop.set()
+
+    elapsed = time.monotonic() - started
+    logging.info(
+        f"[{bucket.bucket_name}] 增量列举完成: {len(shards)} 个分片, {len(expanded)} 个目录, {count} 个对象, "
+        f"耗时 {elapsed:.1f}s"
+    )
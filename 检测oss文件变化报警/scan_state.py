@@ -0,0 +1,192 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+
+
+def normalize_etag(etag):
+    """统一 etag 格式：去掉引号、转为大写（列举结果和事件通知中的写法不同）"""
+    return etag.strip().strip('"').upper()
+
+
+def etag_hash(etag):
+    """把 etag 规范化后压缩成 64 位整数保存，比较变化时足够区分"""
+    return int.from_bytes(hashlib.blake2b(normalize_etag(etag).encode('utf-8'), digest_size=8).digest(), 'big', signed=True)
+
+
+class ScanStateStore:
+    """
+    上次扫描结果的持久化存储（SQLite），每个对象一行: key -> (etag 哈希, size)。
+
+    - 按 key 建主键索引（WITHOUT ROWID），可按 key 顺序遍历，也可按 key 查询
+    - 每次更新在一个事务中完成，进程中途退出不会留下半写的状态
+    - 只更新变化的行，不再整体重写文件
+    - 首次使用时自动导入旧的 last_scan_results.json
+    - 增量扫描时按列举前缀保存水位线（已列举到的最后一个 key）；分片（递归列举）和已展开目录下直接存放的对象
+      （delimiter 列举）各自一条
+    """
+
+    def __init__(self, path, legacy_json_path=None):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS objects ('
+            'key TEXT PRIMARY KEY, etag_hash INTEGER NOT NULL, size INTEGER NOT NULL'
+            ') WITHOUT ROWID'
+        )
+        columns = [row[1] for row in self.conn.execute('PRAGMA table_info(watermarks)')]
+        if 'last_modified' in columns:
+            # 旧版水位线表按前缀一条、带 last_modified，直接丢弃，下次增量扫描按状态库中的最大 key 重新计算
+            self.conn.execute('DROP TABLE watermarks')
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS watermarks ('
+            'prefix TEXT NOT NULL, direct INTEGER NOT NULL, last_key TEXT NOT NULL, updated_at REAL NOT NULL, '
+            'PRIMARY KEY (prefix, direct)'
+            ') WITHOUT ROWID'
+        )
+        self.conn.execute('CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT NOT NULL) WITHOUT ROWID')
+        self.conn.commit()
+        if legacy_json_path and os.path.exists(legacy_json_path) and len(self) == 0:
+            self.import_json(legacy_json_path)
+
+    def __len__(self):
+        return self.conn.execute('SELECT COUNT(*) FROM objects').fetchone()[0]
+
+    def close(self):
+        self.conn.close()
+
+    def import_json(self, json_path):
+        """导入旧版 JSON 状态文件，导入后重命名为 .imported"""
+        with open(json_path, mode='rt') as f:
+            data = json.load(f)
+        with self.conn:
+            self.conn.executemany(
+                'INSERT OR REPLACE INTO objects (key, etag_hash, size) VALUES (?, ?, ?)',
+                ((key, etag_hash(meta['etag']), meta['size']) for key, meta in data.items())
+            )
+        os.replace(json_path, json_path + '.imported')
+        logging.info(f"已从 {json_path} 导入 {len(data)} 条扫描记录")
+
+    def get(self, key):
+        """返回 (etag 哈希, size)，不存在时返回 None"""
+        return self.conn.execute('SELECT etag_hash, size FROM objects WHERE key = ?', (key,)).fetchone()
+
+    def items(self):
+        """按 key 字典序遍历 (key, etag 哈希, size)"""
+        return self.conn.execute('SELECT key, etag_hash, size FROM objects ORDER BY key')
+
+    def apply(self, upserts, deletes=()):
+        """在一个事务中写入新增/修改的对象 [(key, etag, size)] 并删除 [key]"""
+        with self.conn:
+            self.conn.executemany(
+                'INSERT INTO objects (key, etag_hash, size) VALUES (?, ?, ?) '
+                'ON CONFLICT(key) DO UPDATE SET etag_hash = excluded.etag_hash, size = excluded.size',
+                ((key, etag_hash(etag), size) for key, etag, size in upserts)
+            )
+            self.conn.executemany('DELETE FROM objects WHERE key = ?', ((key,) for key in deletes))
+
+    def sync(self, live_objects):
+        """
+        把按 key 字典序排列的实时列举结果与状态库做归并比较，逐个产出变化事件
+        ('added' / 'modified' / 'deleted', key, size)，同时在同一遍扫描中更新状态库。
+
+        状态库通过另一个只读连接按 key 顺序读取（WAL 模式下读到的是一致的快照），
+        内存占用与对象数量无关。全部遍历完成后一次性提交，中途退出则回滚，状态保持不变。
+        """
+        reader = sqlite3.connect(self.path)
+        try:
+            stored = reader.execute('SELECT key, etag_hash, size FROM objects ORDER BY key')
+            with self.conn:
+                live = iter(live_objects)
+                obj = next(live, None)
+                row = stored.fetchone()
+                last_key = None
+                while obj is not None or row is not None:
+                    if obj is not None and last_key is not None and obj.key <= last_key:
+                        raise ValueError(f"列举结果不是按 key 升序排列: {last_key} -> {obj.key}")
+                    if row is None or (obj is not None and obj.key < row[0]):
+                        self._upsert(obj)
+                        yield 'added', obj.key, obj.size
+                        last_key, obj = obj.key, next(live, None)
+                    elif obj is None or row[0] < obj.key:
+                        self.conn.execute('DELETE FROM objects WHERE key = ?', (row[0],))
+                        yield 'deleted', row[0], row[2]
+                        row = stored.fetchone()
+                    else:
+                        if etag_hash(obj.etag) != row[1] or obj.size != row[2]:
+                            self._upsert(obj)
+                            yield 'modified', obj.key, obj.size
+                        last_key, obj = obj.key, next(live, None)
+                        row = stored.fetchone()
+        finally:
+            reader.close()
+
+    def _upsert(self, obj):
+        self.conn.execute(
+            'INSERT INTO objects (key, etag_hash, size) VALUES (?, ?, ?) '
+            'ON CONFLICT(key) DO UPDATE SET etag_hash = excluded.etag_hash, size = excluded.size',
+            (obj.key, etag_hash(obj.etag), obj.size)
+        )
+
+    def watermark(self, prefix, direct=False):
+        """
+        返回列举前缀的水位线 key，增量列举从它之后开始。direct=True 表示只列举直接存放在 prefix 下的对象。
+        没有保存过水位线时（如刚做完全量扫描）取状态库中该前缀下最大的 key，走主键索引范围查询；
+        direct=True 时只取 prefix 之后不再含 '/' 的 key。
+        """
+        row = self.conn.execute(
+            'SELECT last_key FROM watermarks WHERE prefix = ? AND direct = ?', (prefix, int(direct))
+        ).fetchone()
+        if row:
+            return row[0]
+        # U+10FFFF 是 UTF-8 下最大的字符，key >= prefix AND key < prefix + U+10FFFF 即该前缀下的全部 key
+        sql = 'SELECT MAX(key) FROM objects WHERE key >= ? AND key < ?'
+        if direct:
+            sql += " AND instr(substr(key, length(?) + 1), '/') = 0"
+            return self.conn.execute(sql, (prefix, prefix + '\U0010ffff', prefix)).fetchone()[0]
+        return self.conn.execute(sql, (prefix, prefix + '\U0010ffff')).fetchone()[0]
+
+    def advance(self, prefix, objects, direct=False):
+        """
+        写入增量列举到的一页对象，并把 (prefix, direct) 的水位线推进到其中最大的 key，在一个事务中完成。
+        同一前缀的各页按 key 递增依次传入。
+        返回变化事件列表 [('added' / 'modified', key, size)]，与状态库中版本相同的对象不产生事件。
+        水位线只记录 key：水位线之前的 key 被原地覆盖写入（key 不变、内容变化）时增量扫描发现不了，
+        只能由定期的全量扫描发现。
+        """
+        events = []
+        with self.conn:
+            for obj in objects:
+                row = self.get(obj.key)
+                if row is None:
+                    events.append(('added', obj.key, obj.size))
+                elif row != (etag_hash(obj.etag), obj.size):
+                    events.append(('modified', obj.key, obj.size))
+                else:
+                    continue
+                self._upsert(obj)
+            if objects:
+                self.conn.execute(
+                    'INSERT INTO watermarks (prefix, direct, last_key, updated_at) VALUES (?, ?, ?, ?) '
+                    'ON CONFLICT(prefix, direct) DO UPDATE SET last_key = excluded.last_key, updated_at = excluded.updated_at',
+                    (prefix, int(direct), max(obj.key for obj in objects), time.time())
+                )
+        return events
+
+    def last_full_scan(self):
+        """上次全量扫描完成的时间戳，从未做过时返回 0"""
+        row = self.conn.execute("SELECT value FROM meta WHERE name = 'last_full_scan'").fetchone()
+        return float(row[0]) if row else 0
+
+    def mark_full_scan(self):
+        """记录全量扫描完成，清空水位线（之后按状态库中的最大 key 重新计算）"""
+        with self.conn:
+            self.conn.execute('DELETE FROM watermarks')
+            self.conn.execute(
+                "INSERT OR REPLACE INTO meta (name, value) VALUES ('last_full_scan', ?)", (str(time.time()),)
+            )